@@ -1,62 +1,48 @@
+import os
 import random
+import time
 from math import inf
-
-pieceChessScore = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "P": 1}
+import ChessTT
+import ChessMoveOrdering
+import ChessEngine
+import ChessBook
+from ChessScores import pieceChessScore, piecePositionScores
 
 checkMatePoint = inf 
 staleMatePoint = 0
-depth = 3
-
-scoresOfQueen = [[0.0,   0.2,    0.2,    0.3,    0.3,    0.2,    0.2,    0.0],
-                [0.2,   0.4,    0.4,    0.4,    0.4,    0.4,    0.4,    0.2],
-                [0.2,   0.4,    0.5,    0.5,    0.5,    0.5,    0.4,    0.2],
-                [0.3,   0.4,    0.5,    0.5,    0.5,    0.5,    0.4,    0.3],
-                [0.4,   0.4,    0.5,    0.5,    0.5,    0.5,    0.4,    0.3],
-                [0.2,   0.5,    0.5,    0.5,    0.5,    0.5,    0.4,    0.2],
-                [0.2,   0.4,    0.5,    0.4,    0.4,    0.4,    0.4,    0.2],
-                [0.0,   0.2,    0.2,    0.3,    0.3,    0.2,    0.2,    0.0]]
-
-scoresOfKnight = [[0.0,  0.1,    0.2,    0.2,    0.2,    0.2,    0.1,    0.0],
-                 [0.1,  0.3,    0.5,    0.5,    0.5,    0.5,    0.3,    0.1],
-                 [0.2,  0.5,    0.6,    0.65,   0.65,   0.6,    0.5,    0.2],
-                 [0.2,  0.55,   0.65,   0.7,    0.7,    0.65,   0.55,   0.2],
-                 [0.2,  0.5,    0.65,   0.7,    0.7,    0.65,   0.5,    0.2],
-                 [0.2,  0.55,   0.6,    0.65,   0.65,   0.6,    0.55,   0.2],
-                 [0.1,  0.3,    0.5,    0.55,   0.55,   0.5,    0.3,    0.1],
-                 [0.0,  0.1,    0.2,    0.2,    0.2,    0.2,    0.1,    0.0]]
-
-scoresOfBishop = [[0.0,  0.2,    0.2,    0.2,    0.2,    0.2,    0.2,    0.0],
-                 [0.2,  0.4,    0.4,    0.4,    0.4,    0.4,    0.4,    0.2],
-                 [0.2,  0.4,    0.5,    0.6,    0.6,    0.5,    0.4,    0.2],
-                 [0.2,  0.5,    0.5,    0.6,    0.6,    0.5,    0.5,    0.2],
-                 [0.2,  0.4,    0.6,    0.6,    0.6,    0.6,    0.4,    0.2],
-                 [0.2,  0.6,    0.6,    0.6,    0.6,    0.6,    0.6,    0.2],
-                 [0.2,  0.5,    0.4,    0.4,    0.4,    0.4,    0.5,    0.2],
-                 [0.0,  0.2,    0.2,    0.2,    0.2,    0.2,    0.2,    0.0]]
-
-scoresOfRook = [[0.25,   0.25,   0.25,   0.25,   0.25,   0.25,   0.25,   0.25],
-               [0.5,    0.75,   0.75,   0.75,   0.75,   0.75,   0.75,   0.5],
-               [0.0,    0.25,   0.25,   0.25,   0.25,   0.25,   0.25,   0.0],
-               [0.0,    0.25,   0.25,   0.25,   0.25,   0.25,   0.25,   0.0],
-               [0.0,    0.25,   0.25,   0.25,  0.25,   0.25,   0.25,   0.0],
-               [0.0,    0.25,   0.25,   0.25,   0.25,   0.25,   0.25,   0.0],
-               [0.0,    0.25,   0.25,   0.25,   0.25,   0.25,   0.25,   0.0],
-               [0.25,   0.25,   0.25,   0.5,    0.5,    0.25,   0.25,   0.25]]
-
-scoresOfPawn = [[0.8,    0.8,    0.8,    0.8,    0.8,    0.8,    0.8,    0.8],
-               [0.7,    0.7,    0.7,    0.7,    0.7,    0.7,    0.7,    0.7],
-               [0.3,    0.3,    0.4,    0.5,    0.5,    0.4,    0.3,    0.3],
-               [0.25,   0.25,   0.3,    0.45,   0.45,   0.3,    0.25,   0.25],
-               [0.2,    0.2,    0.2,    0.4,    0.4,    0.2,    0.2,    0.2],
-               [0.25,   0.15,   0.1,    0.2,    0.2,    0.1,    0.15,   0.25],
-               [0.25,   0.3,    0.3,    0.0,    0.0,    0.3,    0.3,    0.25],
-               [0.2,    0.2,    0.2,    0.2,    0.2,    0.2,    0.2,    0.2]]
-
-piecePositionScores = {  "wN": scoresOfKnight, "bN": scoresOfKnight[::-1],
-                         "wB": scoresOfBishop, "bB": scoresOfBishop[::-1],
-                         "wQ": scoresOfQueen,  "bQ": scoresOfQueen[::-1],                        
-                         "wR": scoresOfRook,   "bR": scoresOfRook[::-1],
-                         "wP": scoresOfPawn,   "bP": scoresOfPawn[::-1]}
+depth = 3                               # search depth when no time or node budget is given
+maxSearchDepth = 64                     # iterative deepening stops here even if the budget is not used up
+transpositionTableMB = 16               # size of the transposition table
+transpositionTableReplacement = "depth" # "depth" keeps the deeper entry of the current search, "always" overwrites
+transpositionTable = ChessTT.TranspositionTable(transpositionTableMB, transpositionTableReplacement)
+useMoveOrdering = True                  # MVV-LVA, killer and history ordering instead of the shuffled list order
+moveOrdering = ChessMoveOrdering.MoveOrdering()
+useQuiescence = True                    # resolve captures at the horizon instead of scoring the position as it stands
+maxQuiescenceDepth = 8
+deltaMargin = 2                         # delta pruning: skip captures that stay this far below alpha even when they win
+debugEvaluation = False                 # cross-check the incremental board score against a full recompute at every leaf
+stopRequested = None                    # optional callable, the search stops as on a timeout once it returns True
+reportIteration = None                  # optional callable(depth, score, nodes, principal variation) after every iteration
+useOpeningBook = True                   # play a book move without searching while the position is in the opening book
+openingBookPath = None                  # book file, None for ChessBook's openings.bin; a missing file means no book
+bookSelection = "weighted"              # "weighted" picks book moves at random by weight, "best" always the heaviest
+openingBook = None                      # the ChessBook.OpeningBook, opened on first use
+usePVS = True                           # principal variation search: null-window searches for all but the first move
+nullWindow = 1e-6                       # width of the null window; scores are floats, so a move this much better counts as equal
+useAspiration = True                    # search every iteration in a window around the previous score, widened on failure
+aspirationWindow = 0.5                  # half width of the first aspiration window, in pawns
+maxAspirationWindow = 8                 # a window that would grow wider than this is opened all the way
+useNullMove = True                      # null-move pruning: pass the turn, a reduced search still failing high cuts the node
+nullMoveReduction = 2                   # the null move is searched this many plies shallower than the real moves
+nullMoveMinDepth = 3
+useLateMoveReductions = True            # search late quiet moves shallower first, at full depth only if they beat alpha
+lateMoveReduction = 1
+lateMoveMinDepth = 3
+lateMoveMinIndex = 3                    # the first moves (hash move, captures, killers) are never reduced
+profileSearch = False                   # time the profiledMethods and scoreOfBoard in every findBestMove (slows the search)
+profiledMethods = ("getValidMoves", "getLegalMoves", "makeMove", "undoLastMove")
+searchStats = None                      # the SearchStats of the last findBestMove
+aspirationResearches = 0                # root searches of the last findBestMove repeated because the score fell outside the window
 
 
 
@@ -70,6 +56,17 @@ def scoreOfBoard(gState):
     elif gState.staleMate:
         return staleMatePoint # stalemate
 
+    # material and position are kept up to date by makeMove/undoLastMove
+    if debugEvaluation:
+        fullScore = scoreOfBoardFull(gState)
+        if abs(gState.boardScore - fullScore) > 1e-9:
+            raise AssertionError("incremental score {} differs from full score {}".format(gState.boardScore, fullScore))
+    return gState.boardScore
+
+
+
+def scoreOfBoardFull(gState):
+    ''' Material and position score recomputed over all 64 squares '''
     score = 0
 
     for row in range(len(gState.board)):
@@ -93,102 +90,457 @@ def searchRandomMove(validMoves):
 
 
 
-def searchBestMoveMinMax(gState,validMoves, return_queue):
-    """helper method to make first recursive call"""
-    global upcomingMove
-
-    upcomingMove = None
-    random.shuffle(validMoves)
-
-    searchMinMaxAlphaBetaMove(gState, validMoves, depth, -checkMatePoint, checkMatePoint, gState.whiteToMove)
-
-    return_queue.put(upcomingMove)
-
-
-
-def searchMinMAxMove(gState,validMoves, Depth, whiteToMove):
-    global upcomingMove 
-    if Depth == 0: 
-        return scoreOfBoard(gState)
-        
-    if whiteToMove:
-        maxScore = -checkMatePoint
-        for  move in validMoves:
-
-            gState.makeMove(move)
-            upcomingMoves = gState.getValidMoves()
-            score = searchMinMAxMove(gState, upcomingMoves, Depth-1, False)
-
-            if score > maxScore:
-                maxScore = score
-                if Depth == depth:
-                    upcomingMove = move
-
-            gState.undoLastMove()
-
-        return maxScore
-    
-    else:
-        minScore = checkMatePoint
-
-        for move in validMoves:
-
-            gState.makeMove(move)
-            upcomingMoves = gState.getValidMoves()
-            score = searchMinMAxMove(gState, upcomingMoves, Depth-1, True)
-
-            if score < minScore:
-                minScore = score
-                if Depth == depth:
-                    upcomingMove = move
-            gState.undoLastMove()
-        return minScore 
-
-
-
-def searchMinMaxAlphaBetaMove(gState, validMoves, Depth, alpha, beta, maxPlayer):
-
-    global upcomingMove
+def findBookMove(gState, validMoves):
+    """ The opening book's move for gState, or None when the position is not in the book or there is no book file """
+    global openingBook
+    if openingBook is None:
+        path = openingBookPath or ChessBook.defaultBookPath
+        if not os.path.exists(path):
+            return None
+        openingBook = ChessBook.OpeningBook(path)
+    return openingBook.getMove(gState, validMoves, bookSelection)
+
+
 
-    if Depth == 0: 
-        return scoreOfBoard(gState)
-    
-    if maxPlayer:
-        maxScore = -checkMatePoint
+class SearchStats():
+    """
+    What one findBestMove did: node counts, time, the depth reached, transposition table hits, beta cutoffs by the index
+    of the move that caused them, time and nodes per completed depth, and the principal variation. With profileSearch on,
+    also the calls and cumulative time of the GameState methods and scoreOfBoard. Plain attributes, so it pickles."""
 
-        for  move in validMoves:
-            gState.makeMove(move)
-            upcomingMoves = gState.getValidMoves()
-            cscore = searchMinMaxAlphaBetaMove(gState, upcomingMoves, Depth-1, alpha, beta, False)
+    maxCutoffIndex = 16             # cutoffs on later moves are counted in the last bucket
 
-            if cscore > maxScore:
-                maxScore = cscore
-                if Depth == depth:
-                    upcomingMove = move
-            
-            gState.undoLastMove()
-
-            alpha = max(alpha, maxScore)
-            if beta <= alpha:
+    def __init__(self):
+        self.seconds = 0.0
+        self.nodes = 0
+        self.quiescenceNodes = 0
+        self.completedDepth = 0
+        self.bookMove = False
+        self.score = None                       # white's point of view
+        self.principalVariation = []            # moveIDs
+        self.principalVariationText = []        # the same moves in long algebraic notation
+        self.iterations = []                    # (depth, seconds, nodes) when each depth completed, cumulative
+        self.ttProbes = 0
+        self.ttHits = 0
+        self.cutoffsByMoveIndex = [0] * self.maxCutoffIndex
+        self.aspirationResearches = 0
+        self.functionTimes = {}                 # name -> [calls, seconds], only with profileSearch
+
+
+
+    def nodesPerSecond(self):
+        return (self.nodes + self.quiescenceNodes) / self.seconds if self.seconds > 0 else 0.0
+
+
+
+    def branchingFactor(self):
+        """ Effective branching factor: the nodes of the last completed depth over those of the one before """
+        if len(self.iterations) < 2:
+            return 0.0
+        counts = [nodes for depth, seconds, nodes in self.iterations]
+        last, previous = counts[-1] - counts[-2], counts[-2] - (counts[-3] if len(counts) > 2 else 0)
+        return last / previous if previous else 0.0
+
+
+
+    def report(self):
+        if self.bookMove:
+            return "book move {}".format(" ".join(self.principalVariationText))
+        cutoffs = sum(self.cutoffsByMoveIndex)
+        shares = [count / cutoffs if cutoffs else 0.0 for count in self.cutoffsByMoveIndex]
+        lines = ["depth {} in {:.2f}s  {} nodes  {} qnodes  {:.0f} nodes/s  branching factor {:.2f}  aspiration re-searches {}".format(
+                     self.completedDepth, self.seconds, self.nodes, self.quiescenceNodes, self.nodesPerSecond(),
+                     self.branchingFactor(), self.aspirationResearches),
+                 "TT probes {}  hits {} ({:.1%})".format(self.ttProbes, self.ttHits, self.ttHits / self.ttProbes if self.ttProbes else 0.0),
+                 "cutoffs {}  by move index 1: {:.1%}  2: {:.1%}  3: {:.1%}  4+: {:.1%}".format(
+                     cutoffs, shares[0], shares[1], shares[2], sum(shares[3:])),
+                 "depth done at " + "  ".join("{}: {:.3f}s {} nodes".format(depth, seconds, nodes) for depth, seconds, nodes in self.iterations),
+                 "pv " + " ".join(self.principalVariationText)]
+        for name, (calls, seconds) in sorted(self.functionTimes.items(), key=lambda item: -item[1][1]):
+            if calls:
+                lines.append("{:<16} {:>8} calls  {:8.3f}s  {:6.2f} us per call".format(name, calls, seconds, seconds / calls * 1e6))
+        return "\n".join(lines)
+
+
+
+def installProfiling(gStateClass, functionTimes):
+    """
+    Wrap the profiledMethods of gStateClass and the module's scoreOfBoard with timers that add up calls and seconds in
+    functionTimes. Times are cumulative, so getValidMoves includes the getLegalMoves it calls. Returns a function that
+    removes the wrappers again."""
+    global scoreOfBoard
+
+    def timed(name, function):
+        entry = functionTimes.setdefault(name, [0, 0.0])
+        def timedFunction(*args):
+            start = time.perf_counter()
+            result = function(*args)
+            entry[1] += time.perf_counter() - start
+            entry[0] += 1
+            return result
+        return timedFunction
+
+    originals = [(name, gStateClass.__dict__.get(name)) for name in profiledMethods]
+    for name in profiledMethods:
+        setattr(gStateClass, name, timed(name, getattr(gStateClass, name)))
+    unprofiledScoreOfBoard = scoreOfBoard
+    scoreOfBoard = timed("scoreOfBoard", scoreOfBoard)
+
+    def removeProfiling():
+        global scoreOfBoard
+        for name, original in originals:
+            if original is None:
+                delattr(gStateClass, name)          # the method was inherited
+            else:
+                setattr(gStateClass, name, original)
+        scoreOfBoard = unprofiledScoreOfBoard
+    return removeProfiling
+
+
+
+class SearchTimeout(Exception):
+    """ Raised inside the search when the time or node budget of the current move is used up """
+
+
+
+def searchBestMoveMinMax(gState,validMoves, return_queue, timeLimit=None, nodeLimit=None):
+    """ Search in a separate process: puts (best move, SearchStats of the search) on return_queue """
+    move = findBestMove(gState, validMoves, timeLimit, nodeLimit)
+    return_queue.put((move, searchStats))
+
+
+
+def findBestMove(gState, validMoves, timeLimit=None, nodeLimit=None, maxDepth=None):
+    """
+    Iterative deepening: search depth 1, 2, 3 ... until timeLimit seconds or nodeLimit nodes are used up and return the best
+    move of the last completed depth. Without a budget it searches to the module depth, as before. The principal variation
+    of every iteration is searched first in the next one, inside an aspiration window around the iteration's score. A
+    position in the opening book is not searched at all, its book move is returned with completedDepth 0. The module's
+    searchStats describes the search afterwards."""
+    global principalVariation, completedDepth, nodesSearched, quiescenceNodes, deadline, nodeBudget, aspirationResearches
+    global searchStats
+
+    start = time.perf_counter()
+    searchStats = SearchStats()
+    if maxDepth is None:
+        maxDepth = depth if timeLimit is None and nodeLimit is None else maxSearchDepth
+    deadline = None if timeLimit is None else time.perf_counter() + timeLimit
+    nodeBudget = nodeLimit
+    nodesSearched = 0
+    quiescenceNodes = 0
+    aspirationResearches = 0
+    principalVariation = []
+    completedDepth = 0
+    if useOpeningBook:
+        bookMove = findBookMove(gState, validMoves)
+        if bookMove is not None:
+            searchStats.bookMove = True
+            searchStats.principalVariation = [bookMove.moveID]
+            searchStats.principalVariationText = [bookMove.getChessNotation()]
+            searchStats.seconds = time.perf_counter() - start
+            return bookMove
+    bestMove = None
+    score = None
+    color = 1 if gState.whiteToMove else -1
+    random.shuffle(validMoves)                  # equally ordered moves are still picked at random
+    transpositionTable.newSearch()
+    moveOrdering.newSearch()
+    movesMade = len(gState.moveLog)
+    ttProbes, ttHits = transpositionTable.probes, transpositionTable.hits
+    removeProfiling = installProfiling(type(gState), searchStats.functionTimes) if profileSearch else None
+
+    try:
+        for searchDepth in range(1, maxDepth + 1):
+            if bestMove is not None:
+                validMoves.remove(bestMove)
+                validMoves.insert(0, bestMove)
+            try:
+                score, pv = aspirationSearch(gState, validMoves, searchDepth, score)
+            except SearchTimeout:
+                while len(gState.moveLog) > movesMade:     # unwind the moves of the interrupted iteration
+                    gState.undoLastMove()
+                break
+            if not pv:
+                break                                       # every move loses to a mate, keep the previous choice
+            bestMove = next(move for move in validMoves if move.moveID == pv[0])
+            completedDepth = searchDepth
+            principalVariation = pv
+            searchStats.score = color * score
+            searchStats.iterations.append((searchDepth, time.perf_counter() - start, nodesSearched + quiescenceNodes))
+            if reportIteration is not None:
+                reportIteration(searchDepth, color * score, nodesSearched + quiescenceNodes, principalVariation)
+            if abs(score) == checkMatePoint:
+                break                                       # a forced mate was found, searching deeper cannot change it
+            if deadline is not None and time.perf_counter() >= deadline:
                 break
-        return maxScore
-    
+    finally:
+        if removeProfiling is not None:
+            removeProfiling()
+
+    searchStats.seconds = time.perf_counter() - start
+    searchStats.nodes = nodesSearched
+    searchStats.quiescenceNodes = quiescenceNodes
+    searchStats.completedDepth = completedDepth
+    searchStats.aspirationResearches = aspirationResearches
+    searchStats.ttProbes = transpositionTable.probes - ttProbes
+    searchStats.ttHits = transpositionTable.hits - ttHits
+    searchStats.principalVariation = principalVariation
+    for moveID in principalVariation:
+        move = gState.getHashMove(moveID)
+        searchStats.principalVariationText.append(move.getChessNotation())
+        gState.makeMove(move)
+    for moveID in principalVariation:
+        gState.undoLastMove()
+    return bestMove
+
+
+
+def aspirationSearch(gState, validMoves, Depth, previousScore):
+    """
+    Root search of one iteration in a window of aspirationWindow around the previous iteration's score (side to move's
+    view). A score outside the window is only a bound, so the window is widened on that side and the root searched again.
+    Returns (score, principal variation as moveIDs)."""
+    global aspirationResearches
+    if useAspiration and previousScore is not None and abs(previousScore) != checkMatePoint:
+        delta = aspirationWindow
+        alpha, beta = previousScore - delta, previousScore + delta
     else:
-        minScore = checkMatePoint
-
-        for move in validMoves:
-            gState.makeMove(move)
-            upcomingMoves = gState.getValidMoves()
-            cscore = searchMinMaxAlphaBetaMove(gState, upcomingMoves, Depth-1, alpha, beta, True)
-
-            if cscore < minScore:
-                minScore = cscore
-                if Depth == depth:
-                    upcomingMove = move
+        delta = checkMatePoint
+        alpha, beta = -checkMatePoint, checkMatePoint
+    while True:
+        pv = []
+        score = negamaxSearch(gState, validMoves, Depth, alpha, beta, 0, pv)
+        if score <= alpha and alpha != -checkMatePoint:
+            delta *= 4
+            alpha = score - delta if abs(score) != checkMatePoint and delta < maxAspirationWindow else -checkMatePoint
+        elif score >= beta and beta != checkMatePoint:
+            delta *= 4
+            beta = score + delta if abs(score) != checkMatePoint and delta < maxAspirationWindow else checkMatePoint
+        else:
+            return score, pv
+        aspirationResearches += 1
+
+
+
+def scorePosition(gState, Depth, alpha=-checkMatePoint, beta=checkMatePoint, timeLimit=None):
+    """
+    Alpha-beta score of gState searched Depth plies deep (only the quiescence search at Depth 0), without picking a move.
+    alpha, beta and the score are from white's point of view. This is one root move's share of the work in the
+    root-parallel search (ChessParallel). Raises SearchTimeout once timeLimit seconds are used up, with the position
+    restored."""
+    global principalVariation, completedDepth, nodesSearched, quiescenceNodes, deadline, nodeBudget, searchStats
+
+    searchStats = SearchStats()                 # only the cutoff counts are kept, the caller adds up the nodes
+    principalVariation = []
+    completedDepth = 1                          # the caller keeps its previous result, so the budget applies right away
+    nodesSearched = 0
+    quiescenceNodes = 0
+    deadline = None if timeLimit is None else time.perf_counter() + timeLimit
+    nodeBudget = None
+    if gState.halfmoveClock >= 100 or gState.repetitionCount() > 0:
+        return staleMatePoint
+    movesMade = len(gState.moveLog)
+    try:
+        if gState.whiteToMove:
+            return negamaxSearch(gState, None, Depth, alpha, beta, 0, [])
+        return -negamaxSearch(gState, None, Depth, -beta, -alpha, 0, [])
+    except SearchTimeout:
+        while len(gState.moveLog) > movesMade:
             gState.undoLastMove()
-
-            beta = min(beta, minScore)
-            if beta <= alpha:
-                break
-        return minScore
-        
+        raise
+
+
+
+def checkBudget():
+    """ Stop the search once the budget is spent; the first iteration always completes """
+    if completedDepth > 0:
+        if nodeBudget is not None and nodesSearched + quiescenceNodes >= nodeBudget:
+            raise SearchTimeout()
+        if deadline is not None and time.perf_counter() >= deadline:
+            raise SearchTimeout()
+        if stopRequested is not None and stopRequested():
+            raise SearchTimeout()
+
+
+
+def orderMoveFirst(validMoves, moveID):
+    """ Move the move with moveID to the front of the list, if it is there """
+    for i in range(len(validMoves)):
+        if validMoves[i].moveID == moveID:
+            validMoves.insert(0, validMoves.pop(i))
+            return
+
+
+
+def scoreForSideToMove(gState):
+    """ scoreOfBoard from the point of view of the side to move, as the negamax search wants it """
+    return scoreOfBoard(gState) if gState.whiteToMove else -scoreOfBoard(gState)
+
+
+
+def negamaxSearch(gState, validMoves, Depth, alpha, beta, ply, pv):
+    """
+    Negamax alpha-beta with principal variation search; scores are from the side to move's point of view. The first move
+    is searched with the full window, the others with a null window that only proves they are no better, and only a move
+    that beats alpha there is searched again with the full window. pv is filled with the principal variation (moveIDs)
+    below this node. validMoves is the root's move list; below the root it is None and the moves come from the staged
+    generator, so a cutoff on the hash move or a capture never generates the quiet moves."""
+    global nodesSearched
+
+    if ply > 0 and (gState.halfmoveClock >= 100 or gState.repetitionCount() > 0):
+        return staleMatePoint                   # a repeated position or the fifty-move rule: score it as a draw right away
+
+    if Depth == 0:
+        if useQuiescence:
+            return quiescenceSearch(gState, alpha, beta, 0)
+        return scoreForSideToMove(gState)
+
+    nodesSearched += 1
+    checkBudget()
+
+    # transposition table: cut off on a deep enough entry, except at the root and on the principal variation whose moves
+    # the caller wants back in pv
+    alphaOrig = alpha
+    # the width of a null window built from floats as (-alpha - nullWindow, -alpha) can come out slightly above nullWindow
+    isPVNode = beta - alpha > 2 * nullWindow
+    entry = transpositionTable.probe(gState.zobristKey)
+    if entry is not None:
+        entryDepth, entryScore, entryBound, entryMove = entry
+        if entryDepth >= Depth and ply > 0 and not isPVNode:
+            if entryBound == ChessTT.EXACT:
+                return entryScore
+            elif entryBound == ChessTT.LOWERBOUND and entryScore >= beta:
+                return entryScore
+            elif entryBound == ChessTT.UPPERBOUND and entryScore <= alpha:
+                return entryScore
+
+    # null move: if passing the turn still fails high in a shallower search, a real move will too. Not in check, not right
+    # after another null move, and not without pieces, where zugzwang makes passing better than any move.
+    inCheck = (useNullMove or useLateMoveReductions) and gState.isCheck()
+    if (useNullMove and not isPVNode and ply > 0 and Depth >= nullMoveMinDepth and not inCheck and beta != checkMatePoint
+            and gState.moveLog[-1] is not None and gState.hasNonPawnMaterial() and scoreForSideToMove(gState) >= beta):
+        gState.makeNullMove()
+        score = -negamaxSearch(gState, None, max(Depth - 1 - nullMoveReduction, 0), -beta, -beta + nullWindow, ply + 1, [])
+        gState.undoLastMove()
+        if score >= beta:
+            return beta if score == checkMatePoint else score       # a mate found after passing is not proven
+
+    # captures, killers and history first, then the previous iteration's principal variation and the table's best move
+    pvMoveID = principalVariation[ply] if ply < len(principalVariation) else -1
+    if validMoves is not None:
+        if len(validMoves) == 0:
+            return scoreForSideToMove(gState)   # checkmate or stalemate
+        if useMoveOrdering:
+            moveOrdering.orderMoves(validMoves, ply)
+        orderMoveFirst(validMoves, pvMoveID)
+        moves = validMoves
+    else:
+        hashMoveID = entryMove if entry is not None and entryMove >= 0 else pvMoveID
+        if useMoveOrdering:
+            moves = gState.generateValidMoves(hashMoveID, moveOrdering.orderCaptures, lambda quiets: moveOrdering.orderMoves(quiets, ply))
+        else:
+            moves = gState.generateValidMoves(hashMoveID)
+    bestScore = -checkMatePoint
+    bestMove = None
+    movesSearched = 0
+
+    for moveIndex, move in enumerate(moves):
+        movesSearched += 1
+        gState.makeMove(move)
+        childPV = []
+        # late move reductions: a quiet move this far down the ordering is probably bad, try it a ply shallower first
+        reduction = 0
+        if (useLateMoveReductions and Depth >= lateMoveMinDepth and moveIndex >= lateMoveMinIndex and not inCheck
+                and not move.isCapture and not move.isPawnPromotion and not gState.isCheck()):
+            reduction = lateMoveReduction
+        if moveIndex == 0 or alpha == -checkMatePoint:
+            score = -negamaxSearch(gState, None, Depth - 1, -beta, -alpha, ply + 1, childPV)
+        elif not usePVS:
+            score = -negamaxSearch(gState, None, Depth - 1 - reduction, -beta, -alpha, ply + 1, childPV)
+            if reduction and score > alpha:
+                childPV = []
+                score = -negamaxSearch(gState, None, Depth - 1, -beta, -alpha, ply + 1, childPV)
+        else:
+            score = -negamaxSearch(gState, None, Depth - 1 - reduction, -alpha - nullWindow, -alpha, ply + 1, childPV)
+            if reduction and score > alpha:
+                score = -negamaxSearch(gState, None, Depth - 1, -alpha - nullWindow, -alpha, ply + 1, childPV)
+            if alpha < score < beta:
+                childPV = []
+                score = -negamaxSearch(gState, None, Depth - 1, -beta, -alpha, ply + 1, childPV)
+        gState.undoLastMove()
+
+        if score > bestScore or bestMove is None:
+            bestScore = score
+            bestMove = move
+            if score > alpha:
+                alpha = score
+                pv[:] = [move.moveID] + childPV
+        if alpha >= beta:
+            moveOrdering.recordCutoff(move, ply, Depth, moveIndex)
+            searchStats.cutoffsByMoveIndex[min(moveIndex, SearchStats.maxCutoffIndex - 1)] += 1
+            break
+    if movesSearched == 0:
+        return scoreForSideToMove(gState)       # the generator flagged checkmate or stalemate
+    storeTranspositionEntry(gState, Depth, bestScore, alphaOrig, beta, bestMove)
+    return bestScore
+
+
+
+def quiescenceSearch(gState, alpha, beta, qDepth):
+    """
+    Search captures and promotions only, until the position is quiet, so the horizon never scores a position in the middle
+    of an exchange. Negamax like the main search. The side to move may stand pat on the static score; a capture that cannot
+    lift the score back to alpha even with a margin is skipped (delta pruning). In check every evasion is searched."""
+    global quiescenceNodes
+    quiescenceNodes += 1
+    checkBudget()
+
+    if qDepth >= maxQuiescenceDepth:
+        return scoreForSideToMove(gState)
+    moves = gState.getLegalMoves(ChessEngine.stageCaptures)
+    inCheck = gState.inChecks               # the children's move generation overwrites it
+    if inCheck:
+        moves += gState.getLegalMoves(ChessEngine.stageQuiets)
+        if len(moves) == 0:
+            return -checkMatePoint
+        bestScore = -checkMatePoint
+        standPat = bestScore
+    else:
+        standPat = scoreForSideToMove(gState)   # a stalemate without captures is scored as the static position
+        bestScore = standPat
+        if standPat >= beta:
+            return standPat
+        alpha = max(alpha, standPat)
+    moveOrdering.orderCaptures(moves)
+
+    for move in moves:
+        if not inCheck:
+            gain = pieceChessScore[move.pieceCaptured[1]] if move.isCapture else 0
+            if move.isPawnPromotion:
+                gain += pieceChessScore["Q"] - pieceChessScore["P"]
+            if standPat + gain + deltaMargin < alpha:
+                continue
+        gState.makeMove(move)
+        score = -quiescenceSearch(gState, -beta, -alpha, qDepth + 1)
+        gState.undoLastMove()
+
+        if score > bestScore:
+            bestScore = score
+            alpha = max(alpha, score)
+        if alpha >= beta:
+            break
+    return bestScore
+
+
+
+def storeTranspositionEntry(gState, Depth, score, alpha, beta, bestMove):
+    """
+    Store a node result, scored for the side to move; the bound says how the score relates to the window (alpha, beta) it
+    was searched with"""
+    if score <= alpha:
+        bound = ChessTT.UPPERBOUND
+    elif score >= beta:
+        bound = ChessTT.LOWERBOUND
+    else:
+        bound = ChessTT.EXACT
+    transpositionTable.store(gState.zobristKey, Depth, score, bound, bestMove.moveID if bestMove is not None else -1)
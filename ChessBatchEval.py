@@ -0,0 +1,115 @@
+"""
+Batch evaluation with NumPy for analysis jobs that score many positions at once. Positions are encoded as int8 arrays,
+either (N, 64) piece codes or (N, 12, 64) one-hot planes, and scored against the same piece-square tables as the
+incremental GameState.boardScore (material plus position, positive for white) in one vectorized operation.
+
+NumPy is only needed for this module; the game and the search do not import it.
+
+    python ChessBatchEval.py                       batch against scalar scoring at N = 1, 1k and 1M
+    python ChessBatchEval.py --sizes 1 1000 100000
+"""
+import argparse
+import random
+import time
+import numpy as np
+import ChessAlgo
+from ChessEngine import GameState, pieceSquareScores
+from ChessBench import benchmarkPositions
+
+# piece code 0 is an empty square, 1..12 are the planes of encodePlanes shifted by one
+pieceCodes = {color + piece: 1 + i * 6 + j for i, color in enumerate("wb") for j, piece in enumerate("PNBRQK")}
+pieceSquareTable = np.zeros((13, 64))
+for piece, code in pieceCodes.items():
+    pieceSquareTable[code] = [score for row in pieceSquareScores[piece] for score in row]
+planeTable = pieceSquareTable[1:]                   # (12, 64), the table for one-hot planes
+maxScalarPositions = 100000                         # the benchmark extrapolates the scalar time beyond this
+
+
+
+def encodePositions(gStates):
+    """ (N, 64) int8 piece codes, square = row * 8 + col """
+    codes = np.zeros((len(gStates), 64), dtype=np.int8)
+    for n, gState in enumerate(gStates):
+        codes[n] = [pieceCodes.get(piece, 0) for row in gState.board for piece in row]
+    return codes
+
+
+
+def encodePlanes(gStates):
+    """ (N, 12, 64) int8 one-hot planes: wP wN wB wR wQ wK bP bN bB bR bQ bK """
+    codes = encodePositions(gStates)
+    planes = np.zeros((len(gStates), 13, 64), dtype=np.int8)
+    np.put_along_axis(planes, codes[:, None, :].astype(np.intp), 1, axis=1)
+    return planes[:, 1:]
+
+
+
+def scorePositions(positions):
+    """ Scores of a batch of encoded positions, (N, 64) codes or (N, 12, 64) planes, as a float64 array of N """
+    positions = np.asarray(positions)
+    if positions.ndim == 2:
+        return pieceSquareTable[positions, np.arange(64)].sum(axis=1)
+    if positions.ndim == 3:
+        return np.tensordot(positions, planeTable, axes=([1, 2], [0, 1]))
+    raise ValueError("expected (N, 64) piece codes or (N, 12, 64) planes, got shape {}".format(positions.shape))
+
+
+
+def samplePositions(count, seed=0):
+    """ count distinct-ish positions from random games starting at the benchmark positions """
+    rng = random.Random(seed)
+    gStates = []
+    while len(gStates) < count:
+        gState = GameState.fromFEN(benchmarkPositions[len(gStates) % len(benchmarkPositions)][1])
+        for ply in range(rng.randrange(40)):
+            moves = gState.getValidMoves()
+            if not moves:
+                break
+            gState.makeMove(rng.choice(moves))
+        gStates.append(gState)
+    return gStates
+
+
+
+def benchmark(sizes, poolSize=1000):
+    """ Time the scalar scoreOfBoardFull loop against scorePositions; positions are tiled from a pool of random games """
+    pool = samplePositions(poolSize)
+    poolCodes = encodePositions(pool)
+    expected = np.array([gState.computeBoardScore() for gState in pool])
+    if not np.allclose(scorePositions(poolCodes), expected) or not np.allclose(scorePositions(encodePlanes(pool)), expected):
+        raise AssertionError("batch scores differ from GameState.computeBoardScore")
+
+    for size in sizes:
+        scalarCount = min(size, maxScalarPositions)
+        start = time.perf_counter()
+        for i in range(scalarCount):
+            ChessAlgo.scoreOfBoardFull(pool[i % poolSize])
+        scalarTime = (time.perf_counter() - start) * size / scalarCount
+
+        codes = poolCodes[np.arange(size) % poolSize]
+        start = time.perf_counter()
+        scorePositions(codes)
+        codesTime = time.perf_counter() - start
+        line = "N = {:>8}  scalar {:10.6f}s{}  batch (N, 64) {:10.6f}s  ({:7.1f}x)".format(
+            size, scalarTime, " (est.)" if scalarCount < size else "       ", codesTime, scalarTime / max(codesTime, 1e-9))
+
+        if size <= maxScalarPositions:              # (N, 12, 64) planes take 12x the memory, 768 MB at N = 1M
+            planes = encodePlanes(pool)[np.arange(size) % poolSize]
+            start = time.perf_counter()
+            scorePositions(planes)
+            planesTime = time.perf_counter() - start
+            line += "  batch (N, 12, 64) {:10.6f}s  ({:7.1f}x)".format(planesTime, scalarTime / max(planesTime, 1e-9))
+        print(line)
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NumPy batch evaluation against the scalar evaluation")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 1000, 1000000])
+    args = parser.parse_args()
+    benchmark(args.sizes)
+
+
+
+if __name__ == "__main__":
+    main()
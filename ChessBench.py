@@ -0,0 +1,141 @@
+"""
+Headless search benchmark. Runs ChessAlgo.findBestMove on a fixed set of positions and reports nodes, time, move ordering and
+transposition table usage, so search changes and table sizes can be compared without the GUI.
+
+    python ChessBench.py
+    python ChessBench.py --tt-mb 1 4 16 64 --replacement always
+    python ChessBench.py --memory                          Move objects and bytes per searched node
+    python ChessBench.py --profile                         search statistics and time spent per GameState method
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+import ChessAlgo
+import ChessEngine
+import ChessTT
+
+benchmarkPositions = [
+    ("start position", ChessEngine.startFEN),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("italian game", "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4"),
+    ("queen's gambit declined", "rnbqkb1r/ppp2ppp/4pn2/3p4/2PP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 2 4"),
+    ("middlegame", "r2q1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R2Q1RK1 w - - 0 10"),
+    ("rook endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"),
+]
+
+
+
+def searchPosition(fen, timeLimit=None, nodeLimit=None):
+    """ Search one position with the current ChessAlgo settings, return (move, seconds) """
+    gState = ChessEngine.GameState.fromFEN(fen)
+    validMoves = gState.getValidMoves()
+    random.seed(0)                      # the root shuffle is random, keep runs comparable
+    start = time.perf_counter()
+    move = ChessAlgo.findBestMove(gState, validMoves, timeLimit, nodeLimit)
+    return move, time.perf_counter() - start
+
+
+
+def runBenchmark(timeLimit=None, nodeLimit=None, verbose=True):
+    """ Search every benchmark position with a cold table, return the total seconds """
+    totalTime = 0.0
+    totalNodes = 0
+    totalQuiescenceNodes = 0
+    for name, fen in benchmarkPositions:
+        ChessAlgo.transpositionTable.clear()
+        ChessAlgo.moveOrdering.clear()
+        move, elapsed = searchPosition(fen, timeLimit, nodeLimit)
+        totalTime += elapsed
+        totalNodes += ChessAlgo.nodesSearched
+        totalQuiescenceNodes += ChessAlgo.quiescenceNodes
+        if verbose:
+            print("{:<26} {:<8} depth {:>2}  {:>8} nodes  {:>8} qnodes  {:7.2f}s  {}  {}".format(
+                name, str(move), ChessAlgo.completedDepth, ChessAlgo.nodesSearched, ChessAlgo.quiescenceNodes, elapsed,
+                ChessAlgo.moveOrdering.report(), ChessAlgo.transpositionTable.report()))
+            if ChessAlgo.profileSearch:
+                print("    " + ChessAlgo.searchStats.report().replace("\n", "\n    "))
+    if verbose:
+        print("{:<26} {:<8} {:>8} {:>8} nodes  {:>8} qnodes  {:7.2f}s".format("total", "", "", totalNodes, totalQuiescenceNodes, totalTime))
+    return totalTime
+
+
+def moveMemory(samples=10000):
+    """ Bytes per Move object, measured by allocating samples of them """
+    gState = ChessEngine.GameState()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    moves = [ChessEngine.Move((6, 4), (4, 4), gState.board) for i in range(samples)]
+    size = (tracemalloc.get_traced_memory()[0] - before - sys.getsizeof(moves)) / samples
+    tracemalloc.stop()
+    return size
+
+
+
+def moveAllocationReport(timeLimit=None, nodeLimit=None):
+    """ Count the Move objects built per searched node (Move.__init__ wrapped by a counter) and what they cost in bytes """
+    created = [0]
+    init = ChessEngine.Move.__init__
+    def countingInit(self, *args, **kwargs):
+        created[0] += 1
+        init(self, *args, **kwargs)
+    ChessEngine.Move.__init__ = countingInit
+    nodes = 0
+    try:
+        for name, fen in benchmarkPositions:
+            ChessAlgo.transpositionTable.clear()
+            ChessAlgo.moveOrdering.clear()
+            searchPosition(fen, timeLimit, nodeLimit)
+            nodes += ChessAlgo.nodesSearched + ChessAlgo.quiescenceNodes
+    finally:
+        ChessEngine.Move.__init__ = init
+    moveBytes = moveMemory()
+    perNode = created[0] / max(nodes, 1)
+    print("{} nodes  {} moves  {:.1f} moves/node  {:.0f} bytes/move  {:.0f} bytes/node".format(
+        nodes, created[0], perNode, moveBytes, perNode * moveBytes))
+    return perNode, moveBytes
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search benchmark on a fixed position set")
+    parser.add_argument("--depth", type=int, default=ChessAlgo.depth, help="fixed depth when no time or node budget is given")
+    parser.add_argument("--time", type=float, help="seconds per position (iterative deepening)")
+    parser.add_argument("--nodes", type=int, help="nodes per position (iterative deepening)")
+    parser.add_argument("--tt-mb", type=float, nargs="+", default=[ChessAlgo.transpositionTableMB], help="table sizes to compare")
+    parser.add_argument("--no-ordering", action="store_true", help="search moves in shuffled order (A/B baseline)")
+    parser.add_argument("--no-pvs", action="store_true", help="search every move with the full window (A/B baseline)")
+    parser.add_argument("--no-aspiration", action="store_true", help="search every iteration with the full window (A/B baseline)")
+    parser.add_argument("--no-null-move", action="store_true", help="no null-move pruning (A/B baseline)")
+    parser.add_argument("--no-lmr", action="store_true", help="no late move reductions (A/B baseline)")
+    parser.add_argument("--no-quiescence", action="store_true", help="score the horizon statically (A/B baseline)")
+    parser.add_argument("--debug-eval", action="store_true", help="check the incremental evaluation at every leaf")
+    parser.add_argument("--replacement", choices=ChessTT.replacementPolicies, default=ChessAlgo.transpositionTableReplacement)
+    parser.add_argument("--profile", action="store_true", help="print each search's statistics with per-function timing")
+    parser.add_argument("--memory", action="store_true", help="report Move allocations and bytes per searched node")
+    args = parser.parse_args()
+
+    ChessAlgo.depth = args.depth
+    ChessAlgo.useMoveOrdering = not args.no_ordering
+    ChessAlgo.debugEvaluation = args.debug_eval
+    ChessAlgo.useQuiescence = not args.no_quiescence
+    ChessAlgo.usePVS = not args.no_pvs
+    ChessAlgo.useAspiration = not args.no_aspiration
+    ChessAlgo.useNullMove = not args.no_null_move
+    ChessAlgo.useLateMoveReductions = not args.no_lmr
+    ChessAlgo.profileSearch = args.profile
+    ChessAlgo.useOpeningBook = False                # the start position is in the book and would not be searched
+    if args.memory:
+        moveAllocationReport(args.time, args.nodes)
+        return
+    for sizeMB in args.tt_mb:
+        ChessAlgo.transpositionTable = ChessTT.TranspositionTable(sizeMB, args.replacement)
+        budget = "{}s".format(args.time) if args.time else "{} nodes".format(args.nodes) if args.nodes else "depth {}".format(args.depth)
+        print("== {}, {} MB table, {} replacement".format(budget, sizeMB, args.replacement))
+        runBenchmark(args.time, args.nodes)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Bitboard backend for the game state. The position is stored as twelve 64-bit integers (one per piece type and color)
+plus occupancy masks, and legal moves are generated from precomputed attack tables instead of scanning the 8x8 board.
+Square index is row * 8 + col, so square 0 is a8 and square 63 is h1, matching the layout of GameState.board.
+"""
+from ChessEngine import GameState, Move, stageAll, stageCaptures, stageQuiets, \
+    castleWhiteKingSide, castleBlackKingSide, castleWhiteQueenSide, castleBlackQueenSide
+
+pieceIndex = {"wP": 0, "wN": 1, "wB": 2, "wR": 3, "wQ": 4, "wK": 5,
+              "bP": 6, "bN": 7, "bB": 8, "bR": 9, "bQ": 10, "bK": 11}
+indexPiece = {v: k for k, v in pieceIndex.items()}
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 0, 1, 2, 3, 4, 5
+fullBoard = (1 << 64) - 1
+
+# (row step, col step) for every ray, positive directions first so the nearest blocker is the lowest set bit
+rookDirections = ((1, 0), (0, 1), (-1, 0), (0, -1))
+bishopDirections = ((1, 1), (1, -1), (-1, -1), (-1, 1))
+positiveDirections = {(1, 0), (0, 1), (1, 1), (1, -1)}
+
+
+
+def buildLeaperTable(steps):
+    """ For every square, the bitboard of squares reachable with one of the given (row, col) steps """
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        targets = 0
+        for dRow, dCol in steps:
+            endRow, endCol = row + dRow, col + dCol
+            if 0 <= endRow < 8 and 0 <= endCol < 8:
+                targets |= 1 << (endRow * 8 + endCol)
+        table.append(targets)
+    return table
+
+
+
+def buildRayTable(direction):
+    """ For every square, the bitboard of squares along the direction, excluding the square itself """
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        ray = 0
+        for i in range(1, 8):
+            endRow, endCol = row + direction[0] * i, col + direction[1] * i
+            if not (0 <= endRow < 8 and 0 <= endCol < 8):
+                break
+            ray |= 1 << (endRow * 8 + endCol)
+        table.append(ray)
+    return table
+
+
+
+knightAttacks = buildLeaperTable(((1, 2), (1, -2), (-1, 2), (-1, -2), (2, 1), (2, -1), (-2, 1), (-2, -1)))
+kingAttacks = buildLeaperTable(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+pawnAttacks = (buildLeaperTable(((-1, -1), (-1, 1))),      # squares a white pawn attacks
+               buildLeaperTable(((1, -1), (1, 1))))        # squares a black pawn attacks
+rays = {d: buildRayTable(d) for d in rookDirections + bishopDirections}
+
+
+
+def slidingAttacks(sq, occupied, directions):
+    """ Attacked squares of a slider on sq, stopping at (and including) the first blocker on every ray """
+    attacks = 0
+    for d in directions:
+        ray = rays[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if d in positiveDirections:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= rays[d][first]
+        attacks |= ray
+    return attacks
+
+
+
+def buildBetweenTable():
+    """ between[a][b] is the bitboard of squares strictly between a and b when they share a line, 0 otherwise """
+    table = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for d in rookDirections + bishopDirections:
+            ray = rays[d][sq]
+            while ray:
+                target = (ray & -ray).bit_length() - 1
+                table[sq][target] = rays[d][sq] & ~rays[d][target] & ~(1 << target)
+                ray &= ray - 1
+    return table
+
+
+
+between = buildBetweenTable()
+
+
+
+def iterateBits(bitboard):
+    """ Yield the index of every set bit """
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+
+class BitboardGameState(GameState):
+    """
+    Drop-in replacement for GameState. makeMove/undoLastMove keep the 8x8 board in step (the GUI and Move still read it)
+    and update the bitboards by delta; getValidMoves and squareUnderAttack work purely on the bitboards."""
+
+    def __init__(self):
+        super().__init__()
+        self.setUpBitboards()
+
+
+
+    def setFEN(self, fen):
+        super().setFEN(fen)
+        self.setUpBitboards()
+
+
+
+    def setUpBitboards(self):
+        """ Rebuild all bitboards from self.board """
+        self.pieces = [0] * 12
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    self.pieces[pieceIndex[piece]] |= 1 << (row * 8 + col)
+        self.colors = [0, 0]
+        for i in range(6):
+            self.colors[WHITE] |= self.pieces[i]
+            self.colors[BLACK] |= self.pieces[6 + i]
+        self.occupied = self.colors[WHITE] | self.colors[BLACK]
+
+
+
+    def updateBitboards(self, move):
+        """ Apply (or, called a second time, revert) the bitboard changes of move """
+        pieces = self.pieces
+        startBit = 1 << (move.startRow * 8 + move.startCol)
+        endBit = 1 << (move.endRow * 8 + move.endCol)
+        moved = pieceIndex[move.pieceMoved]
+        us, them = (WHITE, BLACK) if moved < 6 else (BLACK, WHITE)
+        ownChange = startBit | endBit
+        pieces[moved] ^= startBit
+        pieces[moved - PAWN + QUEEN if move.isPawnPromotion else moved] ^= endBit
+        if move.isCapture:
+            capturedBit = 1 << (move.startRow * 8 + move.endCol) if move.isEnPassantMove else endBit
+            pieces[pieceIndex[move.pieceCaptured]] ^= capturedBit
+            self.colors[them] ^= capturedBit
+        if move.isCastleMove:
+            rook = moved - KING + ROOK
+            if move.endCol - move.startCol == 2:
+                rookChange = (endBit << 1) | (endBit >> 1)
+            else:
+                rookChange = (endBit >> 2) | (endBit << 1)
+            pieces[rook] ^= rookChange
+            ownChange |= rookChange
+        self.colors[us] ^= ownChange
+        self.occupied = self.colors[WHITE] | self.colors[BLACK]
+
+
+
+    def makeMove(self, move):
+        super().makeMove(move)
+        self.updateBitboards(move)
+
+
+
+    def undoLastMove(self):
+        if len(self.moveLog) != 0:
+            move = self.moveLog[-1]
+            super().undoLastMove()
+            if move is not None:                        # a null move leaves the pieces where they are
+                self.updateBitboards(move)
+
+
+
+    def attackersOf(self, sq, color, occupied):
+        """ Bitboard of the pieces of color that attack sq, given the occupancy """
+        base = 0 if color == WHITE else 6
+        pieces = self.pieces
+        queens = pieces[base + QUEEN]
+        return (pawnAttacks[1 - color][sq] & pieces[base + PAWN]) | \
+               (knightAttacks[sq] & pieces[base + KNIGHT]) | \
+               (kingAttacks[sq] & pieces[base + KING]) | \
+               (slidingAttacks(sq, occupied, rookDirections) & (pieces[base + ROOK] | queens)) | \
+               (slidingAttacks(sq, occupied, bishopDirections) & (pieces[base + BISHOP] | queens))
+
+
+
+    def hasNonPawnMaterial(self):
+        base = 0 if self.whiteToMove else 6
+        pieces = self.pieces
+        return (pieces[base + KNIGHT] | pieces[base + BISHOP] | pieces[base + ROOK] | pieces[base + QUEEN]) != 0
+
+
+
+    def squareUnderAttack(self, row, col):
+        """ Determine if enemy can attack the square row col """
+        enemy = BLACK if self.whiteToMove else WHITE
+        return self.attackersOf(row * 8 + col, enemy, self.occupied) != 0
+
+
+
+    def getPinMasks(self, kingSq, us):
+        """ Map every pinned piece of us to the squares it may still move to (the line between king and pinner) """
+        enemyBase = 6 if us == WHITE else 0
+        own = self.colors[us]
+        pinMasks = {}
+        for directions, sliders in ((rookDirections, self.pieces[enemyBase + ROOK] | self.pieces[enemyBase + QUEEN]),
+                                    (bishopDirections, self.pieces[enemyBase + BISHOP] | self.pieces[enemyBase + QUEEN])):
+            if not slidingAttacks(kingSq, sliders, directions) & sliders:
+                continue                                        # no slider on any of these lines, nothing can pin
+            for d in directions:
+                ray = rays[d][kingSq]
+                blockers = ray & self.occupied
+                if not blockers:
+                    continue
+                if d in positiveDirections:
+                    first = (blockers & -blockers).bit_length() - 1
+                    rest = blockers ^ (1 << first)
+                    second = (rest & -rest).bit_length() - 1 if rest else -1
+                else:
+                    first = blockers.bit_length() - 1
+                    rest = blockers ^ (1 << first)
+                    second = rest.bit_length() - 1 if rest else -1
+                if second >= 0 and own >> first & 1 and sliders >> second & 1:
+                    pinMasks[first] = ray & ~rays[d][second]
+        return pinMasks
+
+
+
+    def getLegalMoves(self, stage, square=None):
+        """
+        Legal moves of one stage (stageAll, stageCaptures or stageQuiets), optionally only those of the piece on square"""
+        moves = []
+        us = WHITE if self.whiteToMove else BLACK
+        them = 1 - us
+        base = 0 if us == WHITE else 6
+        pieces = self.pieces
+        own = self.colors[us]
+        occupied = self.occupied
+        board = self.board
+        if stage == stageCaptures:
+            stageMask = self.colors[them]
+        elif stage == stageQuiets:
+            stageMask = ~occupied & fullBoard
+        else:
+            stageMask = ~own & fullBoard
+        originMask = fullBoard if square is None else 1 << (square[0] * 8 + square[1])
+
+        kingSq = (pieces[base + KING] & -pieces[base + KING]).bit_length() - 1
+        checkers = self.attackersOf(kingSq, them, occupied)
+        self.inChecks = checkers != 0
+
+        # king moves, tested with the king lifted off the board so it cannot hide behind itself
+        if originMask >> kingSq & 1:
+            kingStart = divmod(kingSq, 8)
+            occupiedNoKing = occupied ^ (1 << kingSq)
+            for endSq in iterateBits(kingAttacks[kingSq] & stageMask):
+                if not self.attackersOf(endSq, them, occupiedNoKing):
+                    moves.append(Move(kingStart, divmod(endSq, 8), board))
+
+        if checkers & (checkers - 1) == 0:                      # not in double check
+            if checkers:
+                checkerSq = checkers.bit_length() - 1
+                targetMask = checkers | between[kingSq][checkerSq]
+            else:
+                targetMask = fullBoard
+            pinMasks = self.getPinMasks(kingSq, us)
+            self.getPawnBitboardMoves(us, kingSq, targetMask, pinMasks, checkers, stage, originMask, moves)
+            for pieceType, attacks in ((KNIGHT, None), (BISHOP, bishopDirections), (ROOK, rookDirections), (QUEEN, None)):
+                for startSq in iterateBits(pieces[base + pieceType] & originMask):
+                    if pieceType == KNIGHT:
+                        if startSq in pinMasks:
+                            continue                            # a pinned knight can never move
+                        targets = knightAttacks[startSq]
+                    elif pieceType == QUEEN:
+                        targets = slidingAttacks(startSq, occupied, rookDirections + bishopDirections)
+                    else:
+                        targets = slidingAttacks(startSq, occupied, attacks)
+                    targets &= stageMask & targetMask & pinMasks.get(startSq, fullBoard)
+                    start = divmod(startSq, 8)
+                    for endSq in iterateBits(targets):
+                        moves.append(Move(start, divmod(endSq, 8), board))
+            if not checkers and stage != stageCaptures and originMask >> kingSq & 1:
+                self.getCastleBitboardMoves(us, kingSq, moves)
+
+        return moves
+
+
+
+    def getPawnBitboardMoves(self, us, kingSq, targetMask, pinMasks, checkers, stage, originMask, moves):
+        """ Pushes, captures and en passant captures for the pawns of us; promotions count as captures """
+        base = 0 if us == WHITE else 6
+        empty = ~self.occupied & fullBoard
+        enemy = self.colors[1 - us]
+        step = -8 if us == WHITE else 8
+        startRow = 6 if us == WHITE else 1
+        promotionRow = 1 if us == WHITE else 6              # row a pawn promotes from
+        epSq = self.enpassantPossible[0] * 8 + self.enpassantPossible[1] if self.enpassantPossible else -1
+        if stage == stageQuiets:
+            epSq = -1
+        board = self.board
+        for startSq in iterateBits(self.pieces[base + PAWN] & originMask):
+            allowed = targetMask & pinMasks.get(startSq, fullBoard)
+            targets = pawnAttacks[us][startSq] & enemy if stage != stageQuiets else 0
+            oneStep = startSq + step
+            if empty >> oneStep & 1 and (stage == stageAll or (stage == stageCaptures) == (startSq // 8 == promotionRow)):
+                targets |= 1 << oneStep
+                if startSq // 8 == startRow and empty >> (oneStep + step) & 1:
+                    targets |= 1 << (oneStep + step)
+            start = divmod(startSq, 8)
+            for endSq in iterateBits(targets & allowed):
+                moves.append(Move(start, divmod(endSq, 8), board))
+
+            if epSq >= 0 and pawnAttacks[us][startSq] >> epSq & 1:
+                capturedSq = epSq - step
+                # the capture must land on the pin line and resolve any check (the checker can be the captured pawn)
+                if not (pinMasks.get(startSq, fullBoard) >> epSq & 1):
+                    continue
+                if checkers and not ((targetMask >> epSq & 1) or checkers == 1 << capturedSq):
+                    continue
+                # both pawns leave the rank at once, which can expose the king to a rook or queen
+                occupiedAfter = self.occupied ^ (1 << startSq) ^ (1 << capturedSq) ^ (1 << epSq)
+                enemyBase = 6 if us == WHITE else 0
+                sliders = self.pieces[enemyBase + ROOK] | self.pieces[enemyBase + QUEEN]
+                if slidingAttacks(kingSq, occupiedAfter, rookDirections) & sliders:
+                    continue
+                sliders = self.pieces[enemyBase + BISHOP] | self.pieces[enemyBase + QUEEN]
+                if slidingAttacks(kingSq, occupiedAfter, bishopDirections) & sliders:
+                    continue
+                moves.append(Move(start, divmod(epSq, 8), board, isEnPassantMove=True))
+
+
+
+    def getCastleBitboardMoves(self, us, kingSq, moves):
+        """ Castling moves for a king that is not in check """
+        them = 1 - us
+        if us == WHITE:
+            kingSide, queenSide = self.castlingRights & castleWhiteKingSide, self.castlingRights & castleWhiteQueenSide
+        else:
+            kingSide, queenSide = self.castlingRights & castleBlackKingSide, self.castlingRights & castleBlackQueenSide
+        start = divmod(kingSq, 8)
+        if kingSide and not self.occupied & (0b11 << (kingSq + 1)) and \
+           not self.attackersOf(kingSq + 1, them, self.occupied) and not self.attackersOf(kingSq + 2, them, self.occupied):
+            moves.append(Move(start, divmod(kingSq + 2, 8), self.board, isCastleMove=True))
+        if queenSide and not self.occupied & (0b111 << (kingSq - 3)) and \
+           not self.attackersOf(kingSq - 1, them, self.occupied) and not self.attackersOf(kingSq - 2, them, self.occupied):
+            moves.append(Move(start, divmod(kingSq - 2, 8), self.board, isCastleMove=True))
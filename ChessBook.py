@@ -0,0 +1,190 @@
+"""
+Opening book. Positions are looked up by the GameState Zobrist key in a binary file of 16-byte records sorted by key, laid
+out like a Polyglot book: key (8 bytes), move (2), weight (2), learn (4), big-endian. The move is the 12-bit moveID, so a
+book is only valid for this engine's Zobrist keys. The file is memory-mapped and binary searched, so opening it costs
+nothing up front and every worker process reads the same pages from the OS cache.
+
+    python ChessBook.py                             time the lookups (openings.bin is built first if it is missing)
+    python ChessBook.py --build --lines my.txt      one line per game in long algebraic notation, e.g. e2e4 e7e5 g1f3
+    python ChessBook.py --probe "<fen>"             list the book moves of a position
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+import ChessEngine
+
+recordFormat = struct.Struct(">QHHI")
+keyFormat = struct.Struct(">Q")
+recordBytes = recordFormat.size                     # 16
+maxWeight = 0xFFFF
+defaultBookPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "openings.bin")
+
+# every line adds one to the weight of each of its (position, move) pairs, so common moves are played more often
+openingLines = [
+    "e2e4 e7e5 g1f3 b8c6 f1b5 a7a6 b5a4 g8f6 e1g1 f8e7 f1e1 b7b5 a4b3 d7d6",        # ruy lopez, closed
+    "e2e4 e7e5 g1f3 b8c6 f1b5 g8f6 e1g1 f6e4 d2d4 e4d6 b5c6 d7c6 d4e5 d6f5",        # ruy lopez, berlin
+    "e2e4 e7e5 g1f3 b8c6 f1c4 f8c5 c2c3 g8f6 d2d3 d7d6 e1g1 e8g8",                  # italian, giuoco pianissimo
+    "e2e4 e7e5 g1f3 b8c6 f1c4 g8f6 d2d3 f8e7 e1g1 e8g8",                            # italian, two knights
+    "e2e4 e7e5 g1f3 b8c6 d2d4 e5d4 f3d4 g8f6 d4c6 b7c6 e4e5 d8e7",                  # scotch
+    "e2e4 e7e5 g1f3 g8f6 f3e5 d7d6 e5f3 f6e4 d2d4 d6d5 f1d3",                       # petrov
+    "e2e4 c7c5 g1f3 d7d6 d2d4 c5d4 f3d4 g8f6 b1c3 a7a6 c1e3 e7e5",                  # sicilian, najdorf
+    "e2e4 c7c5 g1f3 b8c6 d2d4 c5d4 f3d4 g8f6 b1c3 e7e5 d4b5 d7d6",                  # sicilian, sveshnikov
+    "e2e4 c7c5 g1f3 e7e6 d2d4 c5d4 f3d4 a7a6 f1d3 g8f6 e1g1",                       # sicilian, kan
+    "e2e4 c7c5 b1c3 b8c6 g2g3 g7g6 f1g2 f8g7 d2d3 d7d6",                            # sicilian, closed
+    "e2e4 e7e6 d2d4 d7d5 b1c3 g8f6 c1g5 f8e7 e4e5 f6d7 g5e7 d8e7",                  # french, classical
+    "e2e4 e7e6 d2d4 d7d5 e4e5 c7c5 c2c3 b8c6 g1f3 d8b6",                            # french, advance
+    "e2e4 c7c6 d2d4 d7d5 b1c3 d5e4 c3e4 c8f5 e4g3 f5g6 h2h4 h7h6",                  # caro-kann, classical
+    "e2e4 c7c6 d2d4 d7d5 e4e5 c8f5 g1f3 e7e6 f1e2 c6c5",                            # caro-kann, advance
+    "e2e4 d7d6 d2d4 g8f6 b1c3 g7g6 g1f3 f8g7 f1e2 e8g8",                            # pirc
+    "d2d4 d7d5 c2c4 e7e6 b1c3 g8f6 c1g5 f8e7 e2e3 e8g8 g1f3 h7h6",                  # queen's gambit declined
+    "d2d4 d7d5 c2c4 c7c6 g1f3 g8f6 b1c3 d5c4 a2a4 c8f5",                            # slav
+    "d2d4 d7d5 c2c4 d5c4 g1f3 g8f6 e2e3 e7e6 f1c4 c7c5 e1g1 a7a6",                  # queen's gambit accepted
+    "d2d4 g8f6 c2c4 g7g6 b1c3 f8g7 e2e4 d7d6 g1f3 e8g8 f1e2 e7e5",                  # king's indian
+    "d2d4 g8f6 c2c4 g7g6 b1c3 d7d5 c4d5 f6d5 e2e4 d5c3 b2c3 f8g7",                  # gruenfeld
+    "d2d4 g8f6 c2c4 e7e6 b1c3 f8b4 e2e3 e8g8 f1d3 d7d5 g1f3 c7c5",                  # nimzo-indian
+    "d2d4 g8f6 c2c4 e7e6 g1f3 b7b6 g2g3 c8a6 b2b3 f8b4 c1d2 b4e7",                  # queen's indian
+    "d2d4 g8f6 g1f3 e7e6 c1f4 c7c5 e2e3 b8c6 c2c3 d7d5",                            # london
+    "c2c4 e7e5 b1c3 g8f6 g1f3 b8c6 g2g3 d7d5 c4d5 f6d5 f1g2",                       # english, four knights
+    "c2c4 g8f6 b1c3 e7e6 g1f3 d7d5 d2d4 f8e7",                                      # english into queen's gambit
+    "g1f3 d7d5 g2g3 g8f6 f1g2 e7e6 e1g1 f8e7 d2d3 e8g8",                            # reti / king's indian attack
+]
+
+
+
+def findMove(gState, text):
+    """ The legal move written in long algebraic notation (e2e4, e7e8q), or None """
+    for move in gState.getValidMoves():
+        if move.getChessNotation() == text[:4]:
+            return move
+    return None
+
+
+
+def buildBook(lines, path=defaultBookPath, fen=None):
+    """ Write the book of the given move lines, each played from fen (the start position if None); returns the number of records """
+    weights = {}
+    for line in lines:
+        gState = ChessEngine.GameState.fromFEN(fen or ChessEngine.startFEN)
+        for text in line.split():
+            move = findMove(gState, text)
+            if move is None:
+                raise ValueError("illegal move {} in opening line: {}".format(text, line))
+            entry = (gState.zobristKey, move.moveID)
+            weights[entry] = weights.get(entry, 0) + 1
+            gState.makeMove(move)
+
+    # sorted by key, and the heaviest move first within a key, as Polyglot books are
+    records = sorted(weights.items(), key=lambda item: (item[0][0], -item[1]))
+    with open(path, "wb") as bookFile:
+        for (key, moveID), weight in records:
+            bookFile.write(recordFormat.pack(key, moveID, min(weight, maxWeight), 0))
+    return len(records)
+
+
+
+class OpeningBook():
+
+    def __init__(self, path=defaultBookPath):
+        self.path = path
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        self.count = size // recordBytes
+        # an empty file cannot be mapped; a book without records simply finds nothing
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b""
+
+
+
+    def entries(self, key):
+        """ [(moveID, weight), ...] stored for the Zobrist key, heaviest first """
+        low, high = 0, self.count
+        while low < high:                                   # first record with a key not below the one looked for
+            middle = (low + high) // 2
+            if keyFormat.unpack_from(self.data, middle * recordBytes)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        while low < self.count:
+            recordKey, moveID, weight, learn = recordFormat.unpack_from(self.data, low * recordBytes)
+            if recordKey != key:
+                break
+            found.append((moveID, weight))
+            low += 1
+        return found
+
+
+
+    def getMove(self, gState, validMoves, selection="weighted"):
+        """
+        A book move for gState out of validMoves, or None when the position is not in the book. selection "weighted" picks
+        at random in proportion to the weights, "best" always plays the heaviest move."""
+        legal = {move.moveID: move for move in validMoves}
+        entries = [(moveID, weight) for moveID, weight in self.entries(gState.zobristKey) if moveID in legal and weight > 0]
+        if not entries:
+            return None
+        if selection == "best":
+            return legal[entries[0][0]]
+        pick = random.randrange(sum(weight for moveID, weight in entries))
+        for moveID, weight in entries:
+            pick -= weight
+            if pick < 0:
+                return legal[moveID]
+
+
+
+    def close(self):
+        if self.count:
+            self.data.close()
+        self.file.close()
+
+
+
+def lookupBenchmark(path, probes=100000):
+    """ Time opening the book and looking up positions that are in it and positions that are not """
+    start = time.perf_counter()
+    book = OpeningBook(path)
+    openTime = time.perf_counter() - start
+    keys = [keyFormat.unpack_from(book.data, i * recordBytes)[0] for i in range(book.count)]
+    missing = [random.getrandbits(64) for i in range(1000)]
+    print("{}: {} records, {} bytes, opened in {:.1f} us".format(path, book.count, book.count * recordBytes, openTime * 1e6))
+    for name, sample in (("hit", keys), ("miss", missing)):
+        start = time.perf_counter()
+        for i in range(probes):
+            book.entries(sample[i % len(sample)])
+        elapsed = time.perf_counter() - start
+        print("{:<4} {:8.2f} us per lookup".format(name, elapsed / probes * 1e6))
+    book.close()
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, probe and time the memory-mapped opening book")
+    parser.add_argument("--book", default=defaultBookPath, help="book file")
+    parser.add_argument("--build", action="store_true", help="(re)build the book, from --lines or the built-in lines")
+    parser.add_argument("--lines", help="text file with one opening line in long algebraic notation per row")
+    parser.add_argument("--probe", metavar="FEN", help="print the book moves of this position")
+    args = parser.parse_args()
+
+    if args.build or (args.probe is None and not os.path.exists(args.book)):
+        lines = openingLines
+        if args.lines:
+            with open(args.lines) as linesFile:
+                lines = [line for line in linesFile if line.strip() and not line.startswith("#")]
+        print("wrote {} records to {}".format(buildBook(lines, args.book), args.book))
+    if args.probe:
+        gState = ChessEngine.GameState.fromFEN(args.probe)
+        book = OpeningBook(args.book)
+        moves = {move.moveID: move for move in gState.getValidMoves()}
+        for moveID, weight in book.entries(gState.zobristKey):
+            print("{} {:>5}".format(moves[moveID].getChessNotation() if moveID in moves else "?" + str(moveID), weight))
+        book.close()
+    elif not args.build:
+        lookupBenchmark(args.book)
+
+
+
+if __name__ == "__main__":
+    main()
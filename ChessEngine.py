@@ -1,6 +1,66 @@
 """
 This class is responsible for storing the chess board and the pieces on it. It will also be responsible for determining the valid moves at the current state of the board.
 """
+import random
+from ChessScores import pieceChessScore, piecePositionScores
+
+# Zobrist keys: one random 64-bit number per (piece, square), side to move, castling rights combination and en passant file.
+# The seed is fixed so every process (search workers, opening book) computes the same key for the same position.
+zobristRandom = random.Random(0x5EED)
+zobristPieces = {color + piece: [[zobristRandom.getrandbits(64) for col in range(8)] for row in range(8)]
+                 for color in "wb" for piece in "PNBRQK"}
+zobristBlackToMove = zobristRandom.getrandbits(64)
+zobristCastling = [zobristRandom.getrandbits(64) for rights in range(16)]
+zobristEnpassant = [zobristRandom.getrandbits(64) for col in range(8)]
+
+# material plus position score of every piece on every square, positive for white, as used by ChessAlgo.scoreOfBoard
+pieceSquareScores = {color + piece: [[(1 if color == "w" else -1) * (pieceChessScore[piece] + (piecePositionScores[color + piece][row][col] if piece != "K" else 0))
+                                      for col in range(8)] for row in range(8)]
+                     for color in "wb" for piece in "PNBRQK"}
+
+# castling rights as bits of one int, the same packing that indexes zobristCastling
+castleWhiteKingSide, castleBlackKingSide, castleWhiteQueenSide, castleBlackQueenSide = 1, 2, 4, 8
+# rights that survive a move from or to a square: a king or rook leaving its home square, or a rook captured there, clears them
+castleRightsMask = [[15] * 8 for row in range(8)]
+castleRightsMask[7][4] = 15 & ~(castleWhiteKingSide | castleWhiteQueenSide)
+castleRightsMask[7][0] = 15 & ~castleWhiteQueenSide
+castleRightsMask[7][7] = 15 & ~castleWhiteKingSide
+castleRightsMask[0][4] = 15 & ~(castleBlackKingSide | castleBlackQueenSide)
+castleRightsMask[0][0] = 15 & ~castleBlackQueenSide
+castleRightsMask[0][7] = 15 & ~castleBlackKingSide
+startFEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+fenPieces = {color + piece: piece if color == "w" else piece.lower() for color in "wb" for piece in "PNBRQK"}
+fenCastling = (("K", castleWhiteKingSide), ("Q", castleWhiteQueenSide), ("k", castleBlackKingSide), ("q", castleBlackQueenSide))
+undoStackSize = 256                     # undo records allocated up front; the stack doubles if a game gets longer
+
+# piece steps, and per square the knight and king targets and the slider rays, built once so the generators never bounds
+# check: knightTargets[row][col] is a tuple of (row, col) targets, queenRays[row][col] one ray of (row, col) squares per
+# direction of kingSteps, nearest square first. Rook rays are the first four, bishop rays the last four.
+rookDirections = ((-1, 0), (0, -1), (1, 0), (0, 1))
+bishopDirections = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+knightSteps = ((-2, 1), (-1, 2), (1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1))
+kingSteps = rookDirections + bishopDirections
+knightTargets = [[tuple((row + dr, col + dc) for dr, dc in knightSteps if 0 <= row + dr < 8 and 0 <= col + dc < 8)
+                  for col in range(8)] for row in range(8)]
+kingTargets = [[tuple((row + dr, col + dc) for dr, dc in kingSteps if 0 <= row + dr < 8 and 0 <= col + dc < 8)
+                for col in range(8)] for row in range(8)]
+queenRays = [[tuple(tuple((row + dr * i, col + dc * i) for i in range(1, 8) if 0 <= row + dr * i < 8 and 0 <= col + dc * i < 8)
+                    for dr, dc in kingSteps) for col in range(8)] for row in range(8)]
+rookRays = [[rays[:4] for rays in rowRays] for rowRays in queenRays]
+bishopRays = [[rays[4:] for rays in rowRays] for rowRays in queenRays]
+
+# move generation stages: everything, captures and promotions only, or the remaining quiet moves
+stageAll, stageCaptures, stageQuiets = 0, 1, 2
+
+
+
+def stageAccepts(stage, endPiece):
+    """ Whether a move onto a square holding endPiece (not an own piece) belongs to the stage """
+    if stage == stageAll:
+        return True
+    return (endPiece != "--") == (stage == stageCaptures)
+
+
 
 class GameState():
 
@@ -41,20 +101,208 @@ class GameState():
         self.inChecks = False           
         self.checkMate = False           
         self.staleMate = False
+        self.draw = False               # threefold repetition or fifty-move rule, set by getValidMoves
         self.pins = []
         self.checks = []
+        self.pinDirections = [None] * 64    # per square row * 8 + col: the direction of the pin holding the piece there
+        self.enemyAttacks = None            # per square: attacked by the opponent with the own king lifted off the board
         self.enpassantPossible = ()
-        self.enpassantPossibleLog = [self.enpassantPossible]
-        self.currentCastlingRight = CastleRights(True,True,True,True)
-        self.castleRightLog = [CastleRights(    self.currentCastlingRight.wks, 
-                                                self.currentCastlingRight.bks, 
-                                                self.currentCastlingRight.wqs, 
-                                                self.currentCastlingRight.bqs)]
+        self.castlingRights = castleWhiteKingSide | castleBlackKingSide | castleWhiteQueenSide | castleBlackQueenSide
+        self.halfmoveClock = 0          # plies since the last capture or pawn move
+        self.fullmoveNumber = 1         # starts at 1, goes up after every black move
+        self.zobristKey = self.computeZobristKey()
+        self.boardScore = self.computeBoardScore()
+        # one reusable record per move in moveLog: castling rights, en passant square, zobrist key, board score and halfmove
+        # clock from before the move (the captured piece is on the move itself), so make/undo only write into existing lists
+        self.undoStack = [[0, (), 0, 0, 0] for i in range(undoStackSize)]
+
+
+
+    @classmethod
+    def fromFEN(cls, fen, moveIDs=()):
+        """ A new game state set up from a FEN string, then the moves with the given moveIDs played from there """
+        gState = cls()
+        gState.setFEN(fen)
+        for moveID in moveIDs:
+            gState.makeMove(gState.getHashMove(moveID))
+        return gState
+
+
+
+    def getHistory(self):
+        """
+        The FEN of the position after the last capture or pawn move and the moveIDs played since. fromFEN(fen, moveIDs)
+        rebuilds this position with every earlier position that can still repeat."""
+        moves = self.moveLog[len(self.moveLog) - min(self.halfmoveClock, len(self.moveLog)):]
+        flags = self.checkMate, self.staleMate, self.draw
+        for move in moves:
+            self.undoLastMove()
+        fen = self.toFEN()
+        for move in moves:
+            self.makeMove(move)
+        self.checkMate, self.staleMate, self.draw = flags
+        return fen, [move.moveID for move in moves]
+
+
+
+    def setFEN(self, fen):
+        """ Replace the position with the one described by a FEN string; the move counters are optional """
+        fields = fen.split()
+        ranks = fields[0].split("/") if fields else []
+        if len(fields) < 4 or len(ranks) != 8 or fields[1] not in ("w", "b"):
+            raise ValueError("invalid FEN: " + fen)
+        board = []
+        for rank in ranks:
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))
+                elif char.upper() in "PNBRQK":
+                    row.append(("w" if char.isupper() else "b") + char.upper())
+                else:
+                    raise ValueError("invalid FEN piece {!r}: {}".format(char, fen))
+            if len(row) != 8:
+                raise ValueError("invalid FEN rank {!r}: {}".format(rank, fen))
+            board.append(row)
+        pieces = [piece for row in board for piece in row]
+        if pieces.count("wK") != 1 or pieces.count("bK") != 1:
+            raise ValueError("invalid FEN, each side needs one king: " + fen)
+        if fields[3] != "-" and (len(fields[3]) != 2 or fields[3][0] not in Move.filesToCols or fields[3][1] not in Move.ranksToRows):
+            raise ValueError("invalid FEN en passant square {!r}: {}".format(fields[3], fen))
+        self.board = board
+        for r in range(8):
+            for c in range(8):
+                if board[r][c] == "wK":
+                    self.whiteKingLocation = (r, c)
+                elif board[r][c] == "bK":
+                    self.blackKingLocation = (r, c)
+
+        self.whiteToMove = fields[1] == "w"
+        # rights the position cannot back up are dropped: a castling right needs its king and rook at home, an en passant
+        # square the pawn that just made a double push behind it
+        self.castlingRights = 0
+        for char, bit in fenCastling:
+            color = "w" if char.isupper() else "b"
+            homeRow = 7 if color == "w" else 0
+            rookCol = 7 if char.upper() == "K" else 0
+            if char in fields[2] and board[homeRow][4] == color + "K" and board[homeRow][rookCol] == color + "R":
+                self.castlingRights |= bit
+        self.enpassantPossible = ()
+        if fields[3] != "-":
+            row, col = Move.ranksToRows[fields[3][1]], Move.filesToCols[fields[3][0]]
+            step, pushedPawn = (1, "bP") if self.whiteToMove else (-1, "wP")
+            if (row == (2 if self.whiteToMove else 5) and board[row + step][col] == pushedPawn and board[row][col] == "--"
+                    and board[row - step][col] == "--"):
+                self.enpassantPossible = (row, col)
+        self.halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        self.moveLog = []
+        self.inChecks = False
+        self.checkMate = False
+        self.staleMate = False
+        self.draw = False
+        self.pins = []
+        self.checks = []
+        self.pinDirections = [None] * 64
+        self.zobristKey = self.computeZobristKey()
+        self.boardScore = self.computeBoardScore()
+
+
+
+    def toFEN(self):
+        """ The position as a FEN string, including the move counters """
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += fenPieces[piece]
+            ranks.append(rank + (str(empty) if empty else ""))
+        castling = "".join(char for char, bit in fenCastling if self.castlingRights & bit) or "-"
+        if self.enpassantPossible:
+            enpassant = Move.colsToFiles[self.enpassantPossible[1]] + Move.rowsToRanks[self.enpassantPossible[0]]
+        else:
+            enpassant = "-"
+        return "{} {} {} {} {} {}".format("/".join(ranks), "w" if self.whiteToMove else "b", castling, enpassant,
+                                          self.halfmoveClock, self.fullmoveNumber)
+
+
+
+    def computeZobristKey(self):
+        """ Hash the whole position from scratch; makeMove keeps zobristKey up to date incrementally """
+        key = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    key ^= zobristPieces[piece][row][col]
+        if not self.whiteToMove:
+            key ^= zobristBlackToMove
+        key ^= zobristCastling[self.castlingRights]
+        if self.enpassantPossible:
+            key ^= zobristEnpassant[self.enpassantPossible[1]]
+        return key
+
+
+
+    def computeBoardScore(self):
+        """ Material plus position score from scratch; makeMove keeps boardScore up to date incrementally """
+        score = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    score += pieceSquareScores[piece][row][col]
+        return score
 
 
 
     def makeMove(self, move):
         """ Make a move on the board """
+        ply = len(self.moveLog)
+        if ply == len(self.undoStack):
+            self.undoStack.extend([0, (), 0, 0, 0] for i in range(ply))
+        record = self.undoStack[ply]
+        record[0] = self.castlingRights
+        record[1] = self.enpassantPossible
+        record[2] = self.zobristKey
+        record[3] = self.boardScore
+        record[4] = self.halfmoveClock
+        if move.pieceMoved[1] == "P" or move.isCapture:
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        if move.pieceMoved[0] == "b":
+            self.fullmoveNumber += 1
+
+        score = self.boardScore - pieceSquareScores[move.pieceMoved][move.startRow][move.startCol]
+        if move.isEnPassantMove:
+            score -= pieceSquareScores[move.pieceCaptured][move.startRow][move.endCol]
+        elif move.pieceCaptured != "--":
+            score -= pieceSquareScores[move.pieceCaptured][move.endRow][move.endCol]
+        if move.isPawnPromotion:
+            score += pieceSquareScores[move.pieceMoved[0] + "Q"][move.endRow][move.endCol]
+        else:
+            score += pieceSquareScores[move.pieceMoved][move.endRow][move.endCol]
+        key = self.zobristKey ^ zobristBlackToMove
+        key ^= zobristPieces[move.pieceMoved][move.startRow][move.startCol]
+        if move.isEnPassantMove:
+            key ^= zobristPieces[move.pieceCaptured][move.startRow][move.endCol]
+        elif move.pieceCaptured != "--":
+            key ^= zobristPieces[move.pieceCaptured][move.endRow][move.endCol]
+        if move.isPawnPromotion:
+            key ^= zobristPieces[move.pieceMoved[0] + "Q"][move.endRow][move.endCol]
+        else:
+            key ^= zobristPieces[move.pieceMoved][move.endRow][move.endCol]
+        if self.enpassantPossible:
+            key ^= zobristEnpassant[self.enpassantPossible[1]]
+        key ^= zobristCastling[self.castlingRights]
 
         self.board[move.startRow][move.startCol] = "--"
         self.board[move.endRow][move.endCol] = move.pieceMoved
@@ -79,34 +327,73 @@ class GameState():
             self.enpassantPossible = ((move.startRow+ move.endRow)//2 , move.startCol)
         else:
             self.enpassantPossible = ()
-            
-        self.enpassantPossibleLog.append(self.enpassantPossible)
+
+        if self.enpassantPossible:
+            key ^= zobristEnpassant[self.enpassantPossible[1]]
         
 
         #update castling rights
         if move.isCastleMove:
+            rookKeys = zobristPieces[move.pieceMoved[0] + "R"][move.endRow]
             if move.endCol - move.startCol == 2:                                                              
                 self.board[move.endRow][move.endCol - 1] = self.board[move.endRow][move.endCol + 1]         
                 self.board[move.endRow][move.endCol + 1] = '--'                                             
+                key ^= rookKeys[move.endCol + 1] ^ rookKeys[move.endCol - 1]
+                rookScores = pieceSquareScores[move.pieceMoved[0] + "R"][move.endRow]
+                score += rookScores[move.endCol - 1] - rookScores[move.endCol + 1]
             else:                                                                                               
                 self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 2]        
                 self.board[move.endRow][move.endCol - 2] = '--'                                              
+                key ^= rookKeys[move.endCol - 2] ^ rookKeys[move.endCol + 1]
+                rookScores = pieceSquareScores[move.pieceMoved[0] + "R"][move.endRow]
+                score += rookScores[move.endCol + 1] - rookScores[move.endCol - 2]
 
 
-        # update castling rights - whenever it is a rook or king move
-        self.updateCastleRights(move)
-        self.castleRightLog.append(CastleRights( self.currentCastlingRight.wks, 
-                                                    self.currentCastlingRight.bks,
-                                                    self.currentCastlingRight.wqs, 
-                                                    self.currentCastlingRight.bqs))
+        # update castling rights - whenever a king or rook leaves its home square or a rook is captured there
+        self.castlingRights &= castleRightsMask[move.startRow][move.startCol] & castleRightsMask[move.endRow][move.endCol]
+        key ^= zobristCastling[self.castlingRights]
+        self.zobristKey = key
+        self.boardScore = score
  
 
+
+    def makeNullMove(self):
+        """
+        Pass the turn without moving, for the search's null-move pruning. It goes into moveLog as None and is taken back
+        by undoLastMove. The halfmove clock restarts, so positions before the null move never count as repetitions."""
+        ply = len(self.moveLog)
+        if ply == len(self.undoStack):
+            self.undoStack.extend([0, (), 0, 0, 0] for i in range(ply))
+        record = self.undoStack[ply]
+        record[0] = self.castlingRights
+        record[1] = self.enpassantPossible
+        record[2] = self.zobristKey
+        record[3] = self.boardScore
+        record[4] = self.halfmoveClock
+        key = self.zobristKey ^ zobristBlackToMove
+        if self.enpassantPossible:
+            key ^= zobristEnpassant[self.enpassantPossible[1]]
+        self.zobristKey = key
+        self.enpassantPossible = ()
+        self.halfmoveClock = 0
+        self.moveLog.append(None)
+        self.whiteToMove = not self.whiteToMove
+
+
    
     def undoLastMove(self):
         """
         undo the last move made"""
         if len(self.moveLog) != 0:
             move = self.moveLog.pop()
+            if move is None:                                    # a null move
+                self.whiteToMove = not self.whiteToMove
+                (self.castlingRights, self.enpassantPossible, self.zobristKey,
+                 self.boardScore, self.halfmoveClock) = self.undoStack[len(self.moveLog)]
+                self.checkMate = False
+                self.staleMate = False
+                self.draw = False
+                return
             self.board[move.startRow][move.startCol] = move.pieceMoved
             self.board[move.endRow][move.endCol] = move.pieceCaptured
             self.whiteToMove = not self.whiteToMove
@@ -122,13 +409,11 @@ class GameState():
                 self.board[move.endRow][move.endCol] = "--"
                 self.board[move.startRow][move.endCol] = move.pieceCaptured
 
-            self.enpassantPossibleLog.pop()
-            self.enpassantPossible = self.enpassantPossibleLog[-1]
-            
-            
-            self.castleRightLog.pop()                                
-            self.currentCastlingRight = self.castleRightLog[-1]   
-            
+            (self.castlingRights, self.enpassantPossible, self.zobristKey,
+             self.boardScore, self.halfmoveClock) = self.undoStack[len(self.moveLog)]
+            if move.pieceMoved[0] == "b":
+                self.fullmoveNumber -= 1
+
             # undo castling move
             if move.isCastleMove:
                 if move.endCol - move.startCol == 2:  
@@ -140,57 +425,87 @@ class GameState():
 
             self.checkMate = False 
             self.staleMate = False
+            self.draw = False
+
+
+
+    def getValidMoves(self):
+        """
+        All Moves condsidering checks"""
+        moves = self.getLegalMoves(stageAll)
+        
+        if len(moves) == 0:
+            if self.inChecks:
+                self.checkMate = True
+            else:
+                self.staleMate = True
+        else:
+            self.checkMate = False
+            self.staleMate = False
+        self.draw = len(moves) > 0 and (self.halfmoveClock >= 100 or self.repetitionCount() >= 2)
+
+        return moves
+
 
 
+    def repetitionCount(self):
+        """
+        How often the current position occurred before in this game. Only the positions since the last capture or pawn
+        move can repeat, and only every second one has the same side to move, so the scan is that short."""
+        key = self.zobristKey
+        ply = len(self.moveLog)
+        count = 0
+        for i in range(ply - 4, ply - min(self.halfmoveClock, ply) - 1, -2):
+            if self.undoStack[i][2] == key:           # the key of the position after i moves
+                count += 1
+        return count
 
-    def updateCastleRights(self, move):
-        """ Update the castle rights for the given move """
 
-        # If the rook has been captured or moved, remove the castling right
-        if move.pieceCaptured == "wR":
-            if move.endCol == 0:                               # if rook is on the left side
-                self.currentCastlingRight.wqs = False
-            elif move.endCol == 7:                             # if rook is on the right side
-                self.currentCastlingRight.wks = False
 
-        elif move.pieceCaptured == "bR":
-            if move.endCol == 0:                               # if rook is on the left side
-                self.currentCastlingRight.bqs = False
-            elif move.endCol == 7:                             # if rook is on the right side
-                self.currentCastlingRight.bks = False
+    def generateValidMoves(self, hashMoveID=-1, orderCaptures=None, orderQuiets=None):
+        """
+        Staged legal move generator for the search: the hash move first, then captures (and promotions), then quiet
+        moves. A stage is only generated once the previous one is used up, so a cutoff early on skips the rest.
+        orderCaptures / orderQuiets sort a stage's list in place. Sets checkMate / staleMate when there is no move."""
+        hashMove = self.getHashMove(hashMoveID) if hashMoveID >= 0 else None
+        if hashMove is not None:
+            yield hashMove
+
+        found = hashMove is not None
+        for stage, order in ((stageCaptures, orderCaptures), (stageQuiets, orderQuiets)):
+            moves = self.getLegalMoves(stage)           # pins and checks are recomputed, the search ran in between
+            if order is not None:
+                order(moves)
+            for move in moves:
+                if hashMove is None or move.moveID != hashMove.moveID:
+                    found = True
+                    yield move
+
+        if not found:
+            if self.inChecks:
+                self.checkMate = True
+            else:
+                self.staleMate = True
 
-        # If rook or king has been moved, remove the castling right
-        if move.pieceMoved == 'wK':                            # if white king has been moved then no castling rights
-            self.currentCastlingRight.wqs = False
-            self.currentCastlingRight.wks = False
 
-        elif move.pieceMoved == 'bK':                          # if black king has been moved then no castling rights
-            self.currentCastlingRight.bqs = False
-            self.currentCastlingRight.bks = False
 
-        elif move.pieceMoved == 'wR':                          # if white rook has been moved then no castling rights
-            if move.startRow == 7:
-                if move.startCol == 0:                         # if rook is on the left side
-                    self.currentCastlingRight.wqs = False
-                elif move.startCol == 7:                       # if rook is on the right side
-                    self.currentCastlingRight.wks = False
+    def getHashMove(self, moveID):
+        """ The legal move with moveID in this position, or None; only the moving piece's moves are generated """
+        startRow, startCol = divmod(moveID >> 6, 8)
+        piece = self.board[startRow][startCol]
+        if piece[0] != ("w" if self.whiteToMove else "b"):
+            return None
+        for move in self.getLegalMoves(stageAll, (startRow, startCol)):
+            if move.moveID == moveID:
+                return move
+        return None
 
-        elif move.pieceMoved == 'bR':                          # if black rook has been moved then no castling rights
-            if move.startRow == 0:
-                if move.startCol == 0:                         # if rook is on the left side
-                    self.currentCastlingRight.bqs = False
-                elif move.startCol == 7:                       # if rook is on the right side
-                    self.currentCastlingRight.bks = False
 
-    
 
-    def getValidMoves(self):
+    def getLegalMoves(self, stage, square=None):
         """
-        All Moves condsidering checks"""
-        tempCastleRights = CastleRights(  self.currentCastlingRight.wks, 
-                                            self.currentCastlingRight.bks,
-                                            self.currentCastlingRight.wqs, 
-                                            self.currentCastlingRight.bqs)
+        Legal moves of one stage (stageAll, stageCaptures or stageQuiets), optionally only those of the piece on square.
+        Unlike getValidMoves it does not touch checkMate / staleMate."""
         moves = []
         self.inChecks, self.pins, self.checks = self.checkForPinsAndCheks()
         
@@ -200,10 +515,11 @@ class GameState():
         else:
             kingRow = self.blackKingLocation[0]
             kingCol = self.blackKingLocation[1]
+        self.enemyAttacks = None                # built by the first king move or castling that needs it, then shared
 
         if self.inChecks:
             if len(self.checks) == 1:
-                moves = self.getAllPossibleMoves()
+                moves = self.getAllPossibleMoves(stage, square)
                 check = self.checks[0]
                 checkRow = check[0]
                 checkCol = check[1]
@@ -217,58 +533,43 @@ class GameState():
                         validSquares.append(validSquare)
                         if validSquare[0] == checkRow and validSquare[1] == checkCol:
                             break
-                for i in range(len(moves)-1,-1,-1):
-                    if moves[i].pieceMoved[1] != "K":
-                        if not (moves[i].endRow, moves[i].endCol) in validSquares:
-                            moves.remove(moves[i])
-            else:
-                self.getKingMoves(kingRow, kingCol, moves)
-        else:
-            moves = self.getAllPossibleMoves()  
-
-            king = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
-            self.getCastleMoves(king[0], king[1], moves)
-        
-        if len(moves) == 0:
-            if self.isCheck():
-                self.checkMate = True
-            else:
-                self.staleMate = True
+                # king moves are already legal; en passant may also remove the checking pawn
+                moves = [move for move in moves if move.pieceMoved[1] == "K" or (move.endRow, move.endCol) in validSquares or
+                         (move.isEnPassantMove and (move.startRow, move.endCol) == (checkRow, checkCol))]
+            elif square is None or square == (kingRow, kingCol):
+                self.getKingMoves(kingRow, kingCol, moves, stage)
         else:
-            self.checkMate = False
-            self.staleMate = False
+            moves = self.getAllPossibleMoves(stage, square)
 
-        self.currentCastlingRight = tempCastleRights
+            if stage != stageCaptures and (square is None or square == (kingRow, kingCol)):
+                self.getCastleMoves(kingRow, kingCol, moves)
 
         return moves
             
    
 
-    def getAllPossibleMoves(self):
+    def getAllPossibleMoves(self, stage=stageAll, square=None):
         """
         All moves without considering checks"""
         moves = []
+        if square is not None:
+            self.moveFuntions[self.board[square[0]][square[1]][1]](square[0], square[1], moves, stage)
+            return moves
         for rows in range(len(self.board)):
             for cols in range(len(self.board[rows])):
                 turn = self.board[rows][cols][0]
                 if (turn == 'w' and self.whiteToMove) or (turn == 'b' and not self.whiteToMove):                                     
                     piece = self.board[rows][cols][1]
-                    self.moveFuntions[piece](rows,cols,moves)   #call the function for the piece
+                    self.moveFuntions[piece](rows,cols,moves,stage)   #call the function for the piece
         return moves
     
 
     
-    def getPawnMoves(self,row,col,moves):
+    def getPawnMoves(self,row,col,moves,stage=stageAll):
         """
         Get all the pawn moves for the pawn located at row, col and add these moves to the list"""
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins)-1,-1,-1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+        pinDirection = self.pinDirections[row * 8 + col]     # a pinned pawn may still move along the pin, either way
+        piecePinned = pinDirection is not None
                     
         if self.whiteToMove:
             moveAmount = -1
@@ -281,14 +582,20 @@ class GameState():
             enemyColor = "w"
             kingRow, kingCol = self.blackKingLocation
 
-        if self.board[row + moveAmount][col] == "--":  # 1 square pawn advance
-            if not piecePinned or pinDirection == (moveAmount, 0):
-                moves.append(Move((row, col), (row + moveAmount, col), self.board))
-                if row == startRow and self.board[row + 2 * moveAmount][col] == "--":  # 2 square pawn advance
-                    moves.append(Move((row, col), (row + 2 * moveAmount, col), self.board))
+        # a push onto the last rank promotes, so it belongs to the capture stage
+        isPromotionPush = row + moveAmount in (0, 7)
+        if stage == stageAll or (stage == stageCaptures) == isPromotionPush:
+            if self.board[row + moveAmount][col] == "--":  # 1 square pawn advance
+                if not piecePinned or pinDirection in ((moveAmount, 0), (-moveAmount, 0)):
+                    moves.append(Move((row, col), (row + moveAmount, col), self.board))
+                    if row == startRow and self.board[row + 2 * moveAmount][col] == "--":  # 2 square pawn advance
+                        moves.append(Move((row, col), (row + 2 * moveAmount, col), self.board))
+
+        if stage == stageQuiets:
+            return
                     
         if col - 1 >= 0:  # capture to the left
-            if not piecePinned or pinDirection == (moveAmount, -1):
+            if not piecePinned or pinDirection in ((moveAmount, -1), (-moveAmount, 1)):
                 if self.board[row + moveAmount][col - 1][0] == enemyColor:
                     moves.append(Move((row, col), (row + moveAmount, col - 1), self.board))
 
@@ -309,13 +616,15 @@ class GameState():
                             square = self.board[row][i]
                             if square[0] == enemyColor and (square[1] == "R" or square[1] == "Q"):
                                 attackingPiece = True
+                                break
                             elif square != "--":
                                 blokcingPiece = True
+                                break
                     if not attackingPiece or blokcingPiece:
                         moves.append(Move((row, col), (row + moveAmount, col - 1), self.board, isEnPassantMove=True))
                         
         if col + 1 <= 7:  # capture to the right
-            if not piecePinned or pinDirection == (moveAmount, +1):
+            if not piecePinned or pinDirection in ((moveAmount, 1), (-moveAmount, -1)):
                 if self.board[row + moveAmount][col + 1][0] == enemyColor:
                     moves.append(Move((row, col), (row + moveAmount, col + 1), self.board))
                 elif (row + moveAmount, col + 1) == self.enpassantPossible:
@@ -334,8 +643,10 @@ class GameState():
                             square = self.board[row][i]
                             if square[0] == enemyColor and (square[1] == "R" or square[1] == "Q"):
                                 attackingPiece = True
+                                break
                             elif square != "--":
                                 blokcingPiece = True
+                                break
                     if not attackingPiece or blokcingPiece:
                         moves.append(Move((row, col), (row + moveAmount, col + 1), self.board, isEnPassantMove=True))
 
@@ -343,125 +654,75 @@ class GameState():
     
 
     
-    def getRookMoves(self,r,c,moves):
+    def getRookMoves(self,r,c,moves,stage=stageAll):
         """
         Get all the rook moves for the rook located at row, col and add these moves to the list"""
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins)-1,-1,-1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                if self.board[r][c][1] != "Q":
-                    self.pins.remove(self.pins[i])
-                break
-        directions = [(1,0),(-1,0),(0,1),(0,-1)]
-        enemyColor = "b" if self.whiteToMove else "w"
-        for direction in directions:
-            for i in range(1,8):
-                endRow = r + direction[0] * i
-                endCol = c + direction[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not piecePinned or pinDirection == direction or pinDirection == (-direction[0], -direction[1]):
-                        endPiece  = self.board[endRow][endCol]
-                        if endPiece == "--":
-                            moves.append(Move((r,c),(endRow,endCol), self.board))
-                        elif endPiece[0] == enemyColor:
-                            moves.append(Move((r,c),(endRow,endCol), self.board))
-                            break
-                        else:
-                            break
-                else:
-                    break
+        self.getSliderMoves(r, c, moves, stage, rookDirections, rookRays[r][c])
     
 
     
-    def getKnightMoves(self,r,c,moves):
+    def getKnightMoves(self,r,c,moves,stage=stageAll):
         """
         Get all the knight moves for the knight located at row, col and add these moves to the list"""
-        piecePinned = False
-        for i in range(len(self.pins)-1,-1,-1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                self.pins.remove(self.pins[i])
-                break
-        directions = [(1,2),(1,-2),(-1,2),(-1,-2),(2,1),(2,-1),(-2,1),(-2,-1)]
+        if self.pinDirections[r * 8 + c] is not None:
+            return                                  # a pinned knight can never move
         allyColor = "w" if self.whiteToMove else "b"
-        for m in directions:
-            endRow = r + m[0]
-            endCol = c + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                if not piecePinned:
-                    endPiece = self.board[endRow][endCol]  
-                    if endPiece[0] !=  allyColor:
-                        moves.append(Move((r,c),(endRow,endCol), self.board))
+        board = self.board
+        for endRow, endCol in knightTargets[r][c]:
+            endPiece = board[endRow][endCol]
+            if endPiece[0] !=  allyColor and stageAccepts(stage, endPiece):
+                moves.append(Move((r,c),(endRow,endCol), board))
 
 
     
-    def getBishopMoves(self,r,c,moves):
+    def getBishopMoves(self,r,c,moves,stage=stageAll):
         """
         Get all the bishop moves for the bishop located at row, col and add these moves to the list"""
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins)-1,-1,-1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-        directions= ((1,1),(-1,1),(1,-1),(-1,-1))
-        enemyColor = "b" if self.whiteToMove else "w"
-        for direction in directions:
-            for i in range(1,8):
-                endRow = r + direction[0] * i
-                endCol = c + direction[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not piecePinned or pinDirection == direction or pinDirection == (-direction[0], -direction[1]):
-                        endPiece = self.board[endRow][endCol]
-                        
-                        if endPiece == "--":
-                            moves.append(Move((r,c),(endRow,endCol), self.board))
-                        elif endPiece[0] == enemyColor:
-                            moves.append(Move((r,c),(endRow,endCol), self.board))
-                            break
-                        else:
-                            break
-                else:
-                    break
+        self.getSliderMoves(r, c, moves, stage, bishopDirections, bishopRays[r][c])
 
 
     
-    def getQueenMoves(self,r,c,moves):
+    def getQueenMoves(self,r,c,moves,stage=stageAll):
         """
         Get all the queen moves for the queen located at row, col and add these moves to the list"""
-        self.getRookMoves(r,c,moves)
-        self.getBishopMoves(r,c,moves)
+        self.getSliderMoves(r, c, moves, stage, kingSteps, queenRays[r][c])
+
+
+
+    def getSliderMoves(self, r, c, moves, stage, directions, rays):
+        """ Moves along the precomputed rays of the square, one per direction, each walked until it is blocked """
+        pinDirection = self.pinDirections[r * 8 + c]
+        enemyColor = "b" if self.whiteToMove else "w"
+        board = self.board
+        for direction, ray in zip(directions, rays):
+            if pinDirection is not None and pinDirection != direction and pinDirection != (-direction[0], -direction[1]):
+                continue                            # a pinned piece only moves along the pin
+            for endRow, endCol in ray:
+                endPiece = board[endRow][endCol]
+                if endPiece == "--":
+                    if stage != stageCaptures:
+                        moves.append(Move((r,c),(endRow,endCol), board))
+                elif endPiece[0] == enemyColor:
+                    if stage != stageQuiets:
+                        moves.append(Move((r,c),(endRow,endCol), board))
+                    break
+                else:
+                    break
 
 
     
-    def getKingMoves(self,r,c,moves):
+    def getKingMoves(self,r,c,moves,stage=stageAll):
         """
         Get all the king moves for the king located at row, col and add these moves to the list"""
-        rowMoves = (-1,-1,-1,0,0,1,1,1)
-        colMoves = (-1,0,1,-1,1,-1,0,1)
         allyColor = "w" if self.whiteToMove else "b"
-        for i in range(8):
-            endRow = r + rowMoves[i]
-            endCol = c + colMoves[i]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:
-                    if allyColor == "w":
-                        self.whiteKingLocation = (endRow,endCol)
-                    else:
-                        self.blackKingLocation = (endRow, endCol)
-                    inChecks, pins, checks = self.checkForPinsAndCheks()
-                    if not inChecks:
-                        moves.append(Move((r,c),(endRow,endCol), self.board))
-                    if allyColor == "w":
-                        self.whiteKingLocation = (r,c)
-                    else:
-                        self.blackKingLocation = (r,c)
+        board = self.board
+        for endRow, endCol in kingTargets[r][c]:
+            endPiece = board[endRow][endCol]
+            if endPiece[0] != allyColor and stageAccepts(stage, endPiece):
+                if self.enemyAttacks is None:
+                    self.enemyAttacks = self.getEnemyAttacks()
+                if not self.enemyAttacks[endRow * 8 + endCol]:
+                    moves.append(Move((r,c),(endRow,endCol), board))
 
 
 
@@ -475,23 +736,95 @@ class GameState():
 
 
     def squareUnderAttack(self, row, col):
-        """ Determine if enemy can attack the square row col """
-
-        self.whiteToMove = not self.whiteToMove          # switch to other player view
-        opponentsMoves = self.getAllPossibleMoves()
+        """
+        Determine if enemy can attack the square row col. Looks outward from the square along the rook and bishop lines
+        and the knight, pawn and king steps, so no opponent moves are generated."""
+        enemyColor = "b" if self.whiteToMove else "w"
+        board = self.board
+
+        for j, ray in enumerate(queenRays[row][col]):
+            sliders = ("R", "Q") if j <= 3 else ("B", "Q")
+            for distance, (endRow, endCol) in enumerate(ray, 1):
+                endPiece = board[endRow][endCol]
+                if endPiece != "--":
+                    if endPiece[0] == enemyColor and (endPiece[1] in sliders or (distance == 1 and endPiece[1] == "K")):
+                        return True
+                    break
 
-        self.whiteToMove = not self.whiteToMove           # switch back to your own view
-        for move in opponentsMoves:
-            if move.endRow == row and move.endCol == col:     # sqaure is attacked
+        enemyKnight = enemyColor + "N"
+        for endRow, endCol in knightTargets[row][col]:
+            if board[endRow][endCol] == enemyKnight:
                 return True
+
+        pawnRow = row + 1 if enemyColor == "w" else row - 1              # white pawns attack upwards, black downwards
+        if 0 <= pawnRow < 8:
+            for endCol in (col - 1, col + 1):
+                if 0 <= endCol < 8 and board[pawnRow][endCol] == enemyColor + "P":
+                    return True
+        return False
+
+
+
+    def hasNonPawnMaterial(self):
+        """ Whether the side to move has a knight, bishop, rook or queen; without one zugzwang is common """
+        color = "w" if self.whiteToMove else "b"
+        for row in self.board:
+            for piece in row:
+                if piece[0] == color and piece[1] in "NBRQ":
+                    return True
         return False
 
 
 
+    def getEnemyAttacks(self):
+        """
+        64 flags, one per square row * 8 + col, set where the opponent attacks. The own king is lifted off the board for
+        it, so a square behind the king on a checking slider's line counts as attacked too."""
+        attacked = bytearray(64)
+        board = self.board
+        enemyColor = "b" if self.whiteToMove else "w"
+        kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+        king = board[kingRow][kingCol]
+        board[kingRow][kingCol] = "--"
+        pawnRowStep = 1 if enemyColor == "b" else -1
+        for r in range(8):
+            boardRow = board[r]
+            for c in range(8):
+                piece = boardRow[c]
+                if piece[0] != enemyColor:
+                    continue
+                kind = piece[1]
+                if kind == "P":
+                    endRow = r + pawnRowStep
+                    if 0 <= endRow < 8:
+                        if c > 0:
+                            attacked[endRow * 8 + c - 1] = 1
+                        if c < 7:
+                            attacked[endRow * 8 + c + 1] = 1
+                elif kind == "N" or kind == "K":
+                    for endRow, endCol in (knightTargets if kind == "N" else kingTargets)[r][c]:
+                        attacked[endRow * 8 + endCol] = 1
+                else:
+                    for ray in (rookRays if kind == "R" else bishopRays if kind == "B" else queenRays)[r][c]:
+                        for endRow, endCol in ray:
+                            attacked[endRow * 8 + endCol] = 1
+                            if board[endRow][endCol] != "--":
+                                break
+        board[kingRow][kingCol] = king
+        return attacked
+
+
+
     def checkForPinsAndCheks(self):
+        """
+        Checks and pins of the side to move, scanned outward from its king. Also fills pinDirections, so the piece
+        generators look up a piece's pin by square instead of searching the pins list."""
         pins = []
         checks = []
         inChecks = False
+        pinDirections = self.pinDirections
+        for pin in self.pins:                       # clear the squares the previous scan marked
+            pinDirections[pin[0] * 8 + pin[1]] = None
         if self.whiteToMove:
             allyColor = "w"
             enemyColor = "b"
@@ -503,48 +836,40 @@ class GameState():
             startRow = self.blackKingLocation[0]
             startCol = self.blackKingLocation[1]
         
-        directions = [(-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
-        for j in range(len(directions)):
-            d = directions[j]
+        board = self.board
+        for j, ray in enumerate(queenRays[startRow][startCol]):
+            d = kingSteps[j]
             possiblePin = ()
-            for i in range(1,8):
-                endRow = startRow + d[0] * i
-                endCol = startCol + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol <8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColor and endPiece[1] != "K":
+            for i, (endRow, endCol) in enumerate(ray, 1):
+                endPiece = board[endRow][endCol]
+                if endPiece[0] == allyColor and endPiece[1] != "K":
+                    if possiblePin == ():
+                        possiblePin = (endRow,endCol,d[0],d[1])
+                    else:
+                        break
+                elif endPiece[0] == enemyColor:
+                    type = endPiece[1]
+                    if  (0 <= j <= 3 and type == "R") or \
+                        (4 <= j <= 7 and type == "B") or \
+                        (i == 1 and type == "P" and ((enemyColor == "w" and 6 <= j <= 7) or (enemyColor == "b" and 4 <= j <= 5))) or \
+                        (type == "Q") or (i == 1 and type == "K"):
                         if possiblePin == ():
-                            possiblePin = (endRow,endCol,d[0],d[1])
-                        else:
+                            inChecks = True
+                            checks.append((endRow,endCol,d[0],d[1]))
                             break
-                    elif endPiece[0] == enemyColor:
-                        type = endPiece[1]
-                        if  (0 <= j <= 3 and type == "R") or \
-                            (4 <= j <= 7 and type == "B") or \
-                            (i == 1 and type == "P" and ((enemyColor == "w" and 6 <= j <= 7) or (enemyColor == "b" and 4 <= j <= 5))) or \
-                            (type == "Q") or (i == 1 and type == "K"):
-                            if possiblePin == ():
-                                inChecks = True
-                                checks.append((endRow,endCol,d[0],d[1]))
-                                break
-                            else:
-                                pins.append(possiblePin)
-                                break
                         else:
+                            pins.append(possiblePin)
+                            pinDirections[possiblePin[0] * 8 + possiblePin[1]] = (possiblePin[2], possiblePin[3])
                             break
-                else:
-                    break
+                    else:
+                        break
 
         #check for knight checks
-        knightMoves = ((-2,1),(-1,2),(1,2),(2,1),(2,-1),(1,-2),(-1,-2),(-2,-1))
-        for m in knightMoves:
-            endRow = startRow + m[0]
-            endCol = startCol + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] == enemyColor and endPiece[1] == "N":
-                    inChecks = True
-                    checks.append((endRow,endCol,m[0],m[1]))
+        enemyKnight = enemyColor + "N"
+        for endRow, endCol in knightTargets[startRow][startCol]:
+            if board[endRow][endCol] == enemyKnight:
+                inChecks = True
+                checks.append((endRow,endCol,endRow - startRow,endCol - startCol))
                     
         return inChecks, pins, checks
 
@@ -553,41 +878,41 @@ class GameState():
     def getCastleMoves(self, row, col, moves):
         """ Generate all valid castle moves for the king at (row, col) and add them to the list of moves. """
         
-        if self.squareUnderAttack(row, col): return                                  # can't castle while in check
+        if self.enemyAttacks is None:
+            self.enemyAttacks = self.getEnemyAttacks()
+        if self.enemyAttacks[row * 8 + col]: return                                    # can't castle while in check
 
-        if  (self.whiteToMove and self.currentCastlingRight.wks) or (not self.whiteToMove and self.currentCastlingRight.bks):
+        if self.castlingRights & (castleWhiteKingSide if self.whiteToMove else castleBlackKingSide):
             self.getKingSideCastleMoves(row, col, moves)
 
-        if (self.whiteToMove and self.currentCastlingRight.wqs) or (not self.whiteToMove and self.currentCastlingRight.bqs):
+        if self.castlingRights & (castleWhiteQueenSide if self.whiteToMove else castleBlackQueenSide):
             self.getQueenSideCastleMoves(row, col, moves)
 
 
 
     def getKingSideCastleMoves(self, row, col, moves):
         if self.board[row][col + 1] == '--' and self.board[row][col + 2] == '--' and \
-          not self.squareUnderAttack(row, col + 1) and not self.squareUnderAttack(row, col + 2):
+          not self.enemyAttacks[row * 8 + col + 1] and not self.enemyAttacks[row * 8 + col + 2]:
                 moves.append(Move((row, col), (row, col + 2), self.board, isCastleMove=True))
 
 
 
     def getQueenSideCastleMoves(self, row, col, moves):
         if self.board[row][col - 1] == '--' and self.board[row][col - 2] == '--' and self.board[row][col - 3] == '--' and \
-          not self.squareUnderAttack(row, col - 1) and not self.squareUnderAttack(row, col - 2):
+          not self.enemyAttacks[row * 8 + col - 1] and not self.enemyAttacks[row * 8 + col - 2]:
             moves.append(Move((row, col), (row, col - 2), self.board, isCastleMove=True))
 
 
 
-class CastleRights():
-    def __init__(self,wks,bks,wqs,bqs):
-        self.wks = wks
-        self.bks = bks
-        self.wqs = wqs
-        self.bqs = bqs
-
+class Move():
+    """
+    A move with __slots__ instead of a per-instance __dict__, millions of them are built during a search. moveID packs the
+    start and end square as startSquare * 64 + endSquare (square = row * 8 + col); promotion is always to a queen, so the
+    two squares identify the move and moveID doubles as the from/to index of the history table."""
 
+    __slots__ = ("startRow", "startCol", "endRow", "endCol", "pieceMoved", "pieceCaptured",
+                 "isPawnPromotion", "isEnPassantMove", "isCastleMove", "isCapture", "moveID")
 
-class Move():
-    
     ranksToRows = {"1":7,"2":6,"3":5,"4":4,"5":3,"6":2,"7":1,"8":0}
     rowsToRanks = {v:k for k,v in ranksToRows.items()}
     filesToCols = {"a":0, "b":1, "c":2, "d":3, "e":4, "f":5, "g":6, "h":7}
@@ -614,7 +939,7 @@ class Move():
         # castle move
         self.isCastleMove = isCastleMove
         self.isCapture = self.pieceCaptured != "--"
-        self.moveID = self.startRow*1000 + self.startCol * 100 + self.endRow *10 + self.endCol
+        self.moveID = (self.startRow * 8 + self.startCol) << 6 | self.endRow * 8 + self.endCol
         
 
     
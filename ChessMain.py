@@ -6,9 +6,10 @@ os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
 import pygame as pg
 import pygame_menu 
 import ChessEngine
+import ChessBitboard
 import ChessAlgo
+import ChessWorker
 import sys
-from multiprocessing import Process, Queue
 from pygame._sdl2.video import Window, WINDOWPOS_CENTERED
 
 
@@ -20,6 +21,8 @@ sq_size = boardWidth // dimensionOfBoard
 
 
 Max_fps = 15 #max frames per second
+AIThinkTime = 5 #seconds the AI may think per move
+useBitboards = False #play on the bitboard backend (ChessBitboard) instead of the 8x8 list board
 images={} 
 
 
@@ -34,6 +37,12 @@ def intiImages():
 
 
 
+def newGameState():
+    """ Create the game state for the selected board backend. """
+    return ChessBitboard.BitboardGameState() if useBitboards else ChessEngine.GameState()
+
+
+
 def main():
     """ Main function for the game. """
     pg.init()
@@ -46,7 +55,7 @@ def main():
     
 
     screen.fill(pg.Color("#4b648a"))    #background color
-    gState = ChessEngine.GameState()        #initialize game state
+    gState = newGameState()                 #initialize game state
     validMoves = gState.getValidMoves()     #get valid moves
     movesMade = False                   #to check if any move has been made
     animate = False                     #to check if we need to animate a move
@@ -58,7 +67,7 @@ def main():
 
     gameOverBoard = False
     AIThinking = False
-    moveFinderProcess= None
+    engine = ChessWorker.EngineWorker(useBitboards)     #one search process for the whole game
     moveLogFont = pg.font.SysFont("Arial",20, False, False)
     moveUndone = False
     
@@ -68,6 +77,7 @@ def main():
         isHumanTurn = chessPlayerOne if gState.whiteToMove else chessPlayerTwo
         for e in pg.event.get():
             if e.type == pg.QUIT:   #if user clicks on the close button
+                engine.close()
                 pg.quit()
                 sys.exit()
 
@@ -106,12 +116,13 @@ def main():
                     animate = False
                     gameOverBoard = False
                     if AIThinking:
-                        moveFinderProcess.terminate()
+                        engine.cancel()
+                        AIThinking = False
                     moveUndone = True
                 
                 # key handling to reset the game by typing 'r'
                 if e.key == pg.K_r:
-                    gState = ChessEngine.GameState()
+                    gState = newGameState()
                     validMoves = gState.getValidMoves()
                     movesMade = False
                     animate = False
@@ -120,7 +131,7 @@ def main():
                     gameOverBoard = False
                     
                     if AIThinking:
-                        moveFinderProcess.terminate()
+                        engine.cancel()
                         AIThinking = False
                     moveUndone = True
 
@@ -129,12 +140,11 @@ def main():
 
             if not AIThinking:
                 AIThinking = True
-                return_queue = Queue()
-                moveFinderProcess = Process(target= ChessAlgo.searchBestMoveMinMax, args=(gState,validMoves, return_queue))
-                moveFinderProcess.start()
+                engine.search(gState, AIThinkTime)
 
-            if not moveFinderProcess.is_alive():
-                AIMove = return_queue.get()
+            AIMoveID = engine.poll()
+            if AIMoveID is not None:
+                AIMove = next((move for move in validMoves if move.moveID == AIMoveID), None)
                 if AIMove is None:
                     AIMove = ChessAlgo.searchRandomMove(validMoves)
                 gState.makeMove(AIMove)
@@ -165,6 +175,9 @@ def main():
         elif gState.staleMate:
              gameOverBoard = True
              screenText(screen, "Stalemate!")
+        elif gState.draw:
+            gameOverBoard = True
+            screenText(screen, "Draw by fifty-move rule!" if gState.halfmoveClock >= 100 else "Draw by repetition!")
         
         clock.tick(Max_fps)
         pg.display.flip()
@@ -0,0 +1,179 @@
+"""
+Headless engine-vs-engine matches. Games are played in parallel over a process pool, straight on GameState and ChessAlgo,
+without the GUI's animation and frame clock. Each opening is played twice with the colours swapped. Engine A and engine B
+are the same code with different ChessAlgo settings, so a search change can be checked for strength and speed.
+
+    python ChessMatch.py --games 12 --movetime 0.2
+    python ChessMatch.py --tc 10+0.1 --b useQuiescence=False
+    python ChessMatch.py --nodes 3000 --a useMoveOrdering=True --b useMoveOrdering=False --workers 8
+"""
+import argparse
+import os
+import random
+import time
+from multiprocessing import Pool
+import ChessAlgo
+import ChessTT
+import ChessMoveOrdering
+from ChessEngine import GameState
+from ChessBench import benchmarkPositions
+
+openingPositions = [fen for name, fen in benchmarkPositions] + [
+    "rnbqkb1r/pp2pppp/3p1n2/8/3NP3/8/PPP2PPP/RNBQKB1R w KQkq - 1 5",          # sicilian
+    "rnbqkbnr/pp3ppp/4p3/2ppP3/3P4/8/PPP2PPP/RNBQKBNR w KQkq - 0 4",          # french advance
+    "rnbqkb1r/ppp1pp1p/5np1/3p4/2PP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 0 4",      # gruenfeld
+    "r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3",      # ruy lopez
+]
+maxGamePlies = 300                  # longer games are adjudicated a draw
+defaultMovesToGo = 30
+
+
+
+def parseSettings(assignments):
+    """ ["useQuiescence=False", "depth=4"] -> {"useQuiescence": False, "depth": 4}, values typed like ChessAlgo's """
+    settings = {}
+    for assignment in assignments:
+        name, value = assignment.split("=", 1)
+        if not hasattr(ChessAlgo, name):
+            raise ValueError("ChessAlgo has no setting " + name)
+        current = getattr(ChessAlgo, name)
+        if isinstance(current, bool):
+            settings[name] = value.lower() in ("1", "true", "yes", "on")
+        else:
+            settings[name] = type(current)(value)
+    return settings
+
+
+
+def playGame(task):
+    """
+    Worker: play one game. Returns (gameIndex, aIsWhite, result "1-0" / "0-1" / "1/2-1/2", reason, per-engine statistics as
+    {"A": [(seconds, depth, nodes), ...], "B": [...]})."""
+    gameIndex, fen, aIsWhite, engines, moveTime, nodeLimit, fixedDepth, clock, ttMB = task
+    random.seed(gameIndex)
+    defaults = {name: getattr(ChessAlgo, name) for settings in engines.values() for name in settings}
+    tables = {name: (ChessTT.TranspositionTable(ttMB), ChessMoveOrdering.MoveOrdering()) for name in engines}
+    clocks = {name: clock[0] for name in engines} if clock else None
+    stats = {name: [] for name in engines}
+    gState = GameState.fromFEN(fen)
+    result, reason = "1/2-1/2", "move limit"
+
+    try:
+        for ply in range(maxGamePlies):
+            validMoves = gState.getValidMoves()
+            if not validMoves:
+                if gState.checkMate:
+                    result, reason = ("0-1" if gState.whiteToMove else "1-0"), "checkmate"
+                else:
+                    reason = "stalemate"
+                break
+            if gState.draw:
+                reason = "fifty moves" if gState.halfmoveClock >= 100 else "repetition"
+                break
+
+            name = "A" if gState.whiteToMove == aIsWhite else "B"
+            for setting, value in defaults.items():
+                setattr(ChessAlgo, setting, value)
+            for setting, value in engines[name].items():
+                setattr(ChessAlgo, setting, value)
+            ChessAlgo.transpositionTable, ChessAlgo.moveOrdering = tables[name]
+            timeLimit = moveTime
+            if clocks is not None:
+                timeLimit = min(clocks[name] / defaultMovesToGo + clock[1] / 2, clocks[name] / 2)
+
+            start = time.perf_counter()
+            move = ChessAlgo.findBestMove(gState, validMoves, timeLimit, nodeLimit, fixedDepth)
+            elapsed = time.perf_counter() - start
+            if ChessAlgo.completedDepth > 0:               # book moves are not searched and would skew the statistics
+                stats[name].append((elapsed, ChessAlgo.completedDepth, ChessAlgo.nodesSearched + ChessAlgo.quiescenceNodes))
+            if clocks is not None:
+                clocks[name] -= elapsed
+                if clocks[name] < 0:
+                    result, reason = ("0-1" if gState.whiteToMove else "1-0"), "time forfeit"
+                    break
+                clocks[name] += clock[1]
+            gState.makeMove(move if move is not None else validMoves[0])
+    finally:
+        # a pool worker plays many games, and the next one reads its defaults from ChessAlgo again
+        for setting, value in defaults.items():
+            setattr(ChessAlgo, setting, value)
+
+    return gameIndex, aIsWhite, result, reason, stats
+
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+
+def runMatch(games, engines, moveTime=None, nodeLimit=None, fixedDepth=None, clock=None, workers=None, ttMB=4, verbose=True):
+    """ Play the match and print the aggregate; returns (wins, draws, losses) from engine A's side """
+    tasks = []
+    for gameIndex in range(games):
+        fen = openingPositions[(gameIndex // 2) % len(openingPositions)]
+        tasks.append((gameIndex, fen, gameIndex % 2 == 0, engines, moveTime, nodeLimit, fixedDepth, clock, ttMB))
+
+    wins = draws = losses = 0
+    reasons = {}
+    stats = {"A": [], "B": []}
+    start = time.perf_counter()
+    with Pool(workers or os.cpu_count()) as pool:
+        for gameIndex, aIsWhite, result, reason, gameStats in pool.imap_unordered(playGame, tasks):
+            if result == "1/2-1/2":
+                draws += 1
+            elif (result == "1-0") == aIsWhite:
+                wins += 1
+            else:
+                losses += 1
+            reasons[reason] = reasons.get(reason, 0) + 1
+            for name in stats:
+                stats[name].extend(gameStats[name])
+            if verbose:
+                print("game {:>3}  A {}  {:<8} {}".format(gameIndex + 1, "white" if aIsWhite else "black", result, reason))
+    elapsed = time.perf_counter() - start
+
+    if verbose:
+        score = (wins + draws / 2) / max(games, 1)
+        print("== {} games in {:.1f}s: A {} wins, {} draws, {} losses, score {:.1%}  ({})".format(
+            games, elapsed, wins, draws, losses, score, ", ".join("{} {}".format(r, n) for r, n in sorted(reasons.items()))))
+        for name in ("A", "B"):
+            moves = stats[name]
+            times = [t for t, d, n in moves]
+            nodes = sum(n for t, d, n in moves)
+            print("{}  {}  {} moves  avg depth {:.2f}  {:.0f} nodes/s  move time p50 {:.3f}s  p90 {:.3f}s  p99 {:.3f}s  max {:.3f}s".format(
+                name, engines[name] or "defaults", len(moves), sum(d for t, d, n in moves) / max(len(moves), 1),
+                nodes / max(sum(times), 1e-9), percentile(times, 0.5), percentile(times, 0.9), percentile(times, 0.99),
+                max(times, default=0.0)))
+    return wins, draws, losses
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless engine-vs-engine match over a process pool")
+    parser.add_argument("--games", type=int, default=2 * len(openingPositions))
+    parser.add_argument("--workers", type=int, help="parallel games (default: all cores)")
+    parser.add_argument("--movetime", type=float, help="seconds per move")
+    parser.add_argument("--nodes", type=int, help="nodes per move")
+    parser.add_argument("--depth", type=int, help="fixed depth per move")
+    parser.add_argument("--tc", help="game clock as base+increment seconds, e.g. 10+0.1")
+    parser.add_argument("--tt-mb", type=float, default=4, help="transposition table per engine and game")
+    parser.add_argument("--a", nargs="*", default=[], metavar="SETTING=VALUE", help="ChessAlgo settings of engine A")
+    parser.add_argument("--b", nargs="*", default=[], metavar="SETTING=VALUE", help="ChessAlgo settings of engine B")
+    args = parser.parse_args()
+
+    clock = tuple(float(part) for part in args.tc.split("+")) if args.tc else None
+    if clock is not None and len(clock) == 1:
+        clock = (clock[0], 0.0)
+    if args.movetime is None and args.nodes is None and args.depth is None and clock is None:
+        args.movetime = 0.2
+    engines = {"A": parseSettings(args.a), "B": parseSettings(args.b)}
+    runMatch(args.games, engines, args.movetime, args.nodes, args.depth, clock, args.workers, args.tt_mb)
+
+
+
+if __name__ == "__main__":
+    main()
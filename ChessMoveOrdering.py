@@ -0,0 +1,96 @@
+"""
+Move ordering for the alpha-beta search: captures by MVV-LVA (most valuable victim, least valuable attacker), then the killer
+moves of the ply, then the remaining quiet moves by their history score. It also counts how often a beta cutoff came from the
+first move searched, which is the usual measure of how good the ordering is.
+"""
+
+orderingValues = {"P": 1, "N": 3, "B": 3, "R": 5, "Q": 9, "K": 10}
+captureBase = 1 << 30           # every capture sorts ahead of every quiet move
+killerScores = (1 << 29, (1 << 29) - 1)
+maxPly = 128
+
+
+
+class MoveOrdering():
+
+    def __init__(self):
+        self.history = [0] * (64 * 64)          # indexed by moveID, which is from square * 64 + to square
+        self.killers = [[-1, -1] for ply in range(maxPly)]
+        self.resetStats()
+
+
+
+    def resetStats(self):
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+
+
+
+    def newSearch(self):
+        """ Forget the killers of the last search and age the history so recent cutoffs count more """
+        self.killers = [[-1, -1] for ply in range(maxPly)]
+        self.history = [h >> 1 for h in self.history]
+
+
+
+    def clear(self):
+        self.history = [0] * (64 * 64)
+        self.killers = [[-1, -1] for ply in range(maxPly)]
+        self.resetStats()
+
+
+
+    def moveScore(self, move, killers):
+        if move.isCapture or move.isPawnPromotion:
+            score = captureBase
+            if move.isCapture:
+                score += orderingValues[move.pieceCaptured[1]] * 16 - orderingValues[move.pieceMoved[1]]
+            if move.isPawnPromotion:
+                score += orderingValues["Q"] * 16
+            return score
+        if move.moveID == killers[0]:
+            return killerScores[0]
+        if move.moveID == killers[1]:
+            return killerScores[1]
+        return self.history[move.moveID]
+
+
+
+    def orderMoves(self, moves, ply):
+        """ Sort moves in place, best candidates first """
+        killers = self.killers[ply] if ply < maxPly else (-1, -1)
+        moves.sort(key=lambda move: self.moveScore(move, killers), reverse=True)
+
+
+
+    def orderCaptures(self, moves):
+        """ Sort captures and promotions in place by MVV-LVA alone, for the quiescence search """
+        moves.sort(key=lambda move: self.moveScore(move, (-1, -1)), reverse=True)
+
+
+
+    def recordCutoff(self, move, ply, depth, moveIndex):
+        """ A move caused a beta cutoff: remember quiet moves as killers and in the history table """
+        self.cutoffs += 1
+        if moveIndex == 0:
+            self.firstMoveCutoffs += 1
+        if move.isCapture or move.isPawnPromotion:
+            return
+        if ply < maxPly:
+            killers = self.killers[ply]
+            if killers[0] != move.moveID:
+                killers[1] = killers[0]
+                killers[0] = move.moveID
+        self.history[move.moveID] += depth * depth
+
+
+
+    def stats(self):
+        return {"cutoffs": self.cutoffs,
+                "firstMoveCutoffs": self.firstMoveCutoffs,
+                "firstMoveCutoffRate": self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0}
+
+
+
+    def report(self):
+        return "cutoffs {cutoffs}  on first move {firstMoveCutoffs} ({firstMoveCutoffRate:.1%})".format(**self.stats())
@@ -0,0 +1,158 @@
+"""
+Root-parallel search. The root moves are split across a persistent pool of worker processes, each with its own
+transposition table and move ordering that stay warm from one search to the next. A position is sent to a worker as a
+FEN string of a few dozen bytes plus the moveIDs since the last capture or pawn move, never as a pickled GameState.
+
+Every iteration of the iterative deepening first searches the previous best move with a full window, then the other root
+moves in parallel with a window that only lets a better move through (alpha-beta's young brothers wait).
+
+    python ChessParallel.py                              speedup curve for 1, 2, 4 ... cores on the benchmark positions
+    python ChessParallel.py --workers 1 4 16 --depth 4
+"""
+import argparse
+import os
+import time
+from multiprocessing import Pool
+import ChessAlgo
+import ChessEngine
+import ChessBitboard
+from ChessBench import benchmarkPositions
+
+checkMatePoint = ChessAlgo.checkMatePoint
+
+# worker process state: the board backend and the search the tables were last used for
+workerBackend = ChessEngine.GameState
+workerSearchID = None
+
+
+
+def initWorker(useBitboards):
+    global workerBackend
+    workerBackend = ChessBitboard.BitboardGameState if useBitboards else ChessEngine.GameState
+
+
+
+def searchRootMove(task):
+    """ Worker: make one root move and score the reply position; returns (moveID, score or None on timeout, nodes) """
+    global workerSearchID
+    fen, history, moveID, depth, alpha, beta, deadline, searchID = task
+    if searchID != workerSearchID:
+        ChessAlgo.transpositionTable.newSearch()
+        ChessAlgo.moveOrdering.newSearch()
+        workerSearchID = searchID
+    timeLimit = None if deadline is None else deadline - time.time()
+    if timeLimit is not None and timeLimit <= 0:
+        return moveID, None, 0
+
+    gState = workerBackend.fromFEN(fen, history)
+    gState.makeMove(gState.getHashMove(moveID))
+    try:
+        score = ChessAlgo.scorePosition(gState, depth, alpha, beta, timeLimit)
+    except ChessAlgo.SearchTimeout:
+        score = None
+    return moveID, score, ChessAlgo.nodesSearched + ChessAlgo.quiescenceNodes
+
+
+
+class ParallelSearch():
+
+    def __init__(self, workers=None, useBitboards=False):
+        self.workers = workers or os.cpu_count()
+        self.pool = Pool(self.workers, initializer=initWorker, initargs=(useBitboards,))
+        self.searchID = 0
+        self.completedDepth = 0
+        self.nodes = 0
+
+
+
+    def findBestMove(self, gState, validMoves, timeLimit=None, maxDepth=None):
+        """
+        Iterative deepening over the pool until timeLimit seconds are used up or maxDepth is done (without either it stops
+        at ChessAlgo.depth), returns the best move of the last completed depth"""
+        if maxDepth is None:
+            maxDepth = ChessAlgo.depth if timeLimit is None else ChessAlgo.maxSearchDepth
+        if len(validMoves) == 0:
+            return None
+        deadline = None if timeLimit is None else time.time() + timeLimit
+        fen, history = gState.getHistory()             # the moves since the last capture or pawn move, for repetitions
+        maximize = gState.whiteToMove
+        self.searchID += 1
+        self.completedDepth = 0
+        self.nodes = 0
+        rootOrder = [move.moveID for move in validMoves]
+        bestMoveID = None
+
+        for searchDepth in range(1, maxDepth + 1):
+            # like the sequential search, the first iteration always completes, so there is a move to return
+            iterationDeadline = deadline if searchDepth > 1 else None
+            task = (fen, history, rootOrder[0], searchDepth - 1, -checkMatePoint, checkMatePoint, iterationDeadline, self.searchID)
+            firstID, firstScore, nodes = self.pool.apply(searchRootMove, (task,))
+            self.nodes += nodes
+            if firstScore is None:
+                break
+
+            # the rest only has to show it is better than the first move, so the window is closed on the other side
+            alpha, beta = (firstScore, checkMatePoint) if maximize else (-checkMatePoint, firstScore)
+            tasks = [(fen, history, moveID, searchDepth - 1, alpha, beta, iterationDeadline, self.searchID) for moveID in rootOrder[1:]]
+            scores = {firstID: firstScore}
+            timedOut = False
+            for moveID, score, nodes in self.pool.imap_unordered(searchRootMove, tasks):
+                self.nodes += nodes
+                if score is None:
+                    timedOut = True
+                else:
+                    scores[moveID] = score
+            if timedOut:
+                break
+
+            # failed-low moves keep their bound, which is no better than the first move, so the sort keeps it in front
+            rootOrder.sort(key=lambda moveID: scores[moveID], reverse=maximize)
+            bestMoveID = rootOrder[0]
+            self.completedDepth = searchDepth
+            if abs(scores[bestMoveID]) == checkMatePoint:
+                break
+
+        return next(move for move in validMoves if move.moveID == bestMoveID)
+
+
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+
+def speedupCurve(workerCounts, searchDepth, useBitboards=False):
+    """ Search every benchmark position at a fixed depth with each pool size, print the time and the speedup over one worker """
+    baseline = None
+    for workers in workerCounts:
+        search = ParallelSearch(workers, useBitboards)
+        totalTime = 0.0
+        totalNodes = 0
+        for name, fen in benchmarkPositions:
+            gState = ChessEngine.GameState.fromFEN(fen)
+            start = time.perf_counter()
+            search.findBestMove(gState, gState.getValidMoves(), maxDepth=searchDepth)
+            totalTime += time.perf_counter() - start
+            totalNodes += search.nodes
+        search.close()
+        baseline = baseline or totalTime
+        print("{:>3} workers  {:8.2f}s  {:>9} nodes  {:>8.0f} nodes/s  speedup {:5.2f}".format(
+            workers, totalTime, totalNodes, totalNodes / max(totalTime, 1e-9), baseline / totalTime))
+
+
+
+def main():
+    cores = os.cpu_count()
+    parser = argparse.ArgumentParser(description="Speedup of the root-parallel search on the benchmark positions")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1 << i for i in range(cores.bit_length()) if 1 << i < cores] + [cores])
+    parser.add_argument("--depth", type=int, default=ChessAlgo.depth)
+    parser.add_argument("--bitboards", action="store_true", help="search on the bitboard backend")
+    args = parser.parse_args()
+    print("== depth {}, {} cores".format(args.depth, cores))
+    speedupCurve(args.workers, args.depth, args.bitboards)
+
+
+
+if __name__ == "__main__":
+    main()
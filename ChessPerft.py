@@ -0,0 +1,174 @@
+"""
+Perft (performance test) for the move generator. It counts every leaf of the legal move tree to a fixed depth and compares
+the totals against published node counts, which checks correctness and measures speed without the GUI.
+
+    python ChessPerft.py                                   run the reference suite
+    python ChessPerft.py --backend bitboard                run it on the bitboard backend
+    python ChessPerft.py --compare                         run it on both backends and compare the speed
+    python ChessPerft.py --staged                          run it through the staged generator used by the search
+    python ChessPerft.py --fen "<fen>" --depth 3 --divide  node count per root move
+    python ChessPerft.py --micro                           time generator calls and make/undo on castling positions
+"""
+import argparse
+import time
+import ChessEngine
+import ChessBitboard
+
+backends = {"list": ChessEngine.GameState, "bitboard": ChessBitboard.BitboardGameState}
+
+# (name, fen, node count for depth 1, 2, 3 ...). The engine only promotes to a queen, so every position stops before
+# the first depth at which an under-promotion becomes possible and the published counts stay valid.
+referencePositions = [
+    ("start position", ChessEngine.startFEN, [20, 400, 8902, 197281]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862]),
+    ("rook endgame, en passant pins", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+    ("illegal en passant (pin)", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", [18, 92, 1670, 10138]),
+    ("illegal en passant (check)", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", [13, 102, 1266, 10276]),
+    ("en passant gives check", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", [15, 126, 1928, 13931]),
+    ("short castling gives check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", [15, 66, 1198, 6399]),
+    ("long castling gives check", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", [16, 71, 1286, 7418]),
+    ("castling rights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", [26, 1141, 27826]),
+    ("castling prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", [44, 1494, 50509]),
+    ("discovered check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1", [29, 165, 5160]),
+    ("pinned pawn moves to king", "k7/8/8/8/4K3/8/4P3/4r3 w - - 0 1", [9, 100, 810, 12916]),
+    ("pinned pawn en passant", "k7/2K5/8/3pP3/8/8/7b/8 w - d6 0 1", [7, 49, 297, 3116]),
+    ("self stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1", [2, 6, 13, 63]),
+    ("stalemate and checkmate", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", [37, 183, 6559, 23527]),
+]
+
+
+
+def perft(gState, depth, staged=False):
+    """
+    Count the leaf nodes of the legal move tree, counting the last ply straight from the move list. staged walks the tree
+    with the search's staged generator (generateValidMoves) instead of getValidMoves."""
+    moves = list(gState.generateValidMoves()) if staged else gState.getValidMoves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        gState.makeMove(move)
+        nodes += perft(gState, depth - 1, staged)
+        gState.undoLastMove()
+    return nodes
+
+
+
+def divide(gState, depth, staged=False):
+    """ Perft split by root move, the usual way to find which move a generator bug hides under """
+    counts = {}
+    for move in gState.getValidMoves():
+        gState.makeMove(move)
+        counts[move.getChessNotation()] = perft(gState, depth - 1, staged) if depth > 1 else 1
+        gState.undoLastMove()
+    return counts
+
+
+# positions where both sides may still castle, so every move generation runs the castling attack checks
+microPositions = ["kiwipete", "castling rights", "castling prevented"]
+
+
+
+def microBenchmark(backend=ChessEngine.GameState, repeats=200, verbose=True):
+    """
+    Time getValidMoves, a full-board squareUnderAttack sweep and a make/undo of every legal move on the castling positions,
+    return the seconds per call."""
+    results = {}
+    for name, fen, counts in referencePositions:
+        if name not in microPositions:
+            continue
+        gState = backend.fromFEN(fen)
+        start = time.perf_counter()
+        for i in range(repeats):
+            gState.getValidMoves()
+        moveTime = (time.perf_counter() - start) / repeats
+        start = time.perf_counter()
+        for i in range(repeats):
+            for r in range(8):
+                for c in range(8):
+                    gState.squareUnderAttack(r, c)
+        attackTime = (time.perf_counter() - start) / (repeats * 64)
+        moves = gState.getValidMoves()
+        start = time.perf_counter()
+        for i in range(repeats):
+            for move in moves:
+                gState.makeMove(move)
+                gState.undoLastMove()
+        makeUndoTime = (time.perf_counter() - start) / (repeats * len(moves))
+        results[name] = (moveTime, attackTime, makeUndoTime)
+        if verbose:
+            print("{:<32} getValidMoves {:8.1f} us  squareUnderAttack {:7.2f} us  makeMove + undoLastMove {:6.2f} us".format(
+                name, moveTime * 1e6, attackTime * 1e6, makeUndoTime * 1e6))
+    return results
+
+
+
+def runSuite(backend=ChessEngine.GameState, maxDepth=None, verbose=True, staged=False):
+    """ Run every reference position, return (all counts correct, total nodes, total seconds) """
+    allCorrect = True
+    totalNodes = 0
+    totalTime = 0.0
+    for name, fen, counts in referencePositions:
+        depth = len(counts) if maxDepth is None else min(maxDepth, len(counts))
+        gState = backend.fromFEN(fen)
+        start = time.perf_counter()
+        nodes = perft(gState, depth, staged)
+        elapsed = time.perf_counter() - start
+        correct = nodes == counts[depth - 1]
+        allCorrect = allCorrect and correct
+        totalNodes += nodes
+        totalTime += elapsed
+        if verbose:
+            print("{:<32} depth {}  {:>9} nodes  {:7.2f}s  {:>8.0f} nodes/s  {}".format(
+                name, depth, nodes, elapsed, nodes / max(elapsed, 1e-9), "ok" if correct else "FAIL (expected {})".format(counts[depth - 1])))
+    if verbose:
+        print("{:<32}          {:>9} nodes  {:7.2f}s  {:>8.0f} nodes/s  {}".format(
+            "total", totalNodes, totalTime, totalNodes / max(totalTime, 1e-9), "ok" if allCorrect else "FAIL"))
+    return allCorrect, totalNodes, totalTime
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft correctness and speed test for the move generator")
+    parser.add_argument("--backend", choices=sorted(backends), default="list")
+    parser.add_argument("--compare", action="store_true", help="run the suite on every backend")
+    parser.add_argument("--fen", help="run a single position instead of the reference suite")
+    parser.add_argument("--depth", type=int, help="search depth (caps the suite depth)")
+    parser.add_argument("--staged", action="store_true", help="generate moves with the staged generator used by the search")
+    parser.add_argument("--divide", action="store_true", help="print the node count of every root move")
+    parser.add_argument("--micro", action="store_true", help="time move generation, attack queries and make/undo on castling positions")
+    args = parser.parse_args()
+
+    if args.micro:
+        for name in sorted(backends) if args.compare else [args.backend]:
+            print("== {} backend".format(name))
+            microBenchmark(backends[name])
+        return True
+
+    if args.fen:
+        depth = args.depth or 3
+        gState = backends[args.backend].fromFEN(args.fen)
+        start = time.perf_counter()
+        if args.divide:
+            counts = divide(gState, depth, args.staged)
+            for move in sorted(counts):
+                print("{}: {}".format(move, counts[move]))
+            nodes = sum(counts.values())
+        else:
+            nodes = perft(gState, depth, args.staged)
+        elapsed = time.perf_counter() - start
+        print("perft({}) = {}  {:.2f}s  {:.0f} nodes/s".format(depth, nodes, elapsed, nodes / max(elapsed, 1e-9)))
+        return True
+
+    names = sorted(backends) if args.compare else [args.backend]
+    allCorrect = True
+    for name in names:
+        print("== {} backend".format(name))
+        correct, nodes, elapsed = runSuite(backends[name], args.depth, staged=args.staged)
+        allCorrect = allCorrect and correct
+    return allCorrect
+
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() else 1)
@@ -0,0 +1,57 @@
+"""
+Material values and piece-square tables of the evaluation, in pawns. ChessAlgo scores positions with them and ChessEngine
+builds its incremental per-square scores from them, so they live apart from both.
+"""
+
+pieceChessScore = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "P": 1}
+
+scoresOfQueen = [[0.0,   0.2,    0.2,    0.3,    0.3,    0.2,    0.2,    0.0],
+                [0.2,   0.4,    0.4,    0.4,    0.4,    0.4,    0.4,    0.2],
+                [0.2,   0.4,    0.5,    0.5,    0.5,    0.5,    0.4,    0.2],
+                [0.3,   0.4,    0.5,    0.5,    0.5,    0.5,    0.4,    0.3],
+                [0.4,   0.4,    0.5,    0.5,    0.5,    0.5,    0.4,    0.3],
+                [0.2,   0.5,    0.5,    0.5,    0.5,    0.5,    0.4,    0.2],
+                [0.2,   0.4,    0.5,    0.4,    0.4,    0.4,    0.4,    0.2],
+                [0.0,   0.2,    0.2,    0.3,    0.3,    0.2,    0.2,    0.0]]
+
+scoresOfKnight = [[0.0,  0.1,    0.2,    0.2,    0.2,    0.2,    0.1,    0.0],
+                 [0.1,  0.3,    0.5,    0.5,    0.5,    0.5,    0.3,    0.1],
+                 [0.2,  0.5,    0.6,    0.65,   0.65,   0.6,    0.5,    0.2],
+                 [0.2,  0.55,   0.65,   0.7,    0.7,    0.65,   0.55,   0.2],
+                 [0.2,  0.5,    0.65,   0.7,    0.7,    0.65,   0.5,    0.2],
+                 [0.2,  0.55,   0.6,    0.65,   0.65,   0.6,    0.55,   0.2],
+                 [0.1,  0.3,    0.5,    0.55,   0.55,   0.5,    0.3,    0.1],
+                 [0.0,  0.1,    0.2,    0.2,    0.2,    0.2,    0.1,    0.0]]
+
+scoresOfBishop = [[0.0,  0.2,    0.2,    0.2,    0.2,    0.2,    0.2,    0.0],
+                 [0.2,  0.4,    0.4,    0.4,    0.4,    0.4,    0.4,    0.2],
+                 [0.2,  0.4,    0.5,    0.6,    0.6,    0.5,    0.4,    0.2],
+                 [0.2,  0.5,    0.5,    0.6,    0.6,    0.5,    0.5,    0.2],
+                 [0.2,  0.4,    0.6,    0.6,    0.6,    0.6,    0.4,    0.2],
+                 [0.2,  0.6,    0.6,    0.6,    0.6,    0.6,    0.6,    0.2],
+                 [0.2,  0.5,    0.4,    0.4,    0.4,    0.4,    0.5,    0.2],
+                 [0.0,  0.2,    0.2,    0.2,    0.2,    0.2,    0.2,    0.0]]
+
+scoresOfRook = [[0.25,   0.25,   0.25,   0.25,   0.25,   0.25,   0.25,   0.25],
+               [0.5,    0.75,   0.75,   0.75,   0.75,   0.75,   0.75,   0.5],
+               [0.0,    0.25,   0.25,   0.25,   0.25,   0.25,   0.25,   0.0],
+               [0.0,    0.25,   0.25,   0.25,   0.25,   0.25,   0.25,   0.0],
+               [0.0,    0.25,   0.25,   0.25,  0.25,   0.25,   0.25,   0.0],
+               [0.0,    0.25,   0.25,   0.25,   0.25,   0.25,   0.25,   0.0],
+               [0.0,    0.25,   0.25,   0.25,   0.25,   0.25,   0.25,   0.0],
+               [0.25,   0.25,   0.25,   0.5,    0.5,    0.25,   0.25,   0.25]]
+
+scoresOfPawn = [[0.8,    0.8,    0.8,    0.8,    0.8,    0.8,    0.8,    0.8],
+               [0.7,    0.7,    0.7,    0.7,    0.7,    0.7,    0.7,    0.7],
+               [0.3,    0.3,    0.4,    0.5,    0.5,    0.4,    0.3,    0.3],
+               [0.25,   0.25,   0.3,    0.45,   0.45,   0.3,    0.25,   0.25],
+               [0.2,    0.2,    0.2,    0.4,    0.4,    0.2,    0.2,    0.2],
+               [0.25,   0.15,   0.1,    0.2,    0.2,    0.1,    0.15,   0.25],
+               [0.25,   0.3,    0.3,    0.0,    0.0,    0.3,    0.3,    0.25],
+               [0.2,    0.2,    0.2,    0.2,    0.2,    0.2,    0.2,    0.2]]
+
+piecePositionScores = {  "wN": scoresOfKnight, "bN": scoresOfKnight[::-1],
+                         "wB": scoresOfBishop, "bB": scoresOfBishop[::-1],
+                         "wQ": scoresOfQueen,  "bQ": scoresOfQueen[::-1],                        
+                         "wR": scoresOfRook,   "bR": scoresOfRook[::-1],
+                         "wP": scoresOfPawn,   "bP": scoresOfPawn[::-1]}
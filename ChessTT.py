@@ -0,0 +1,119 @@
+"""
+Fixed-size transposition table for the alpha-beta search. Entries live in parallel typed arrays (one slot per index) rather
+than as Python objects, so the memory use is fixed up front and known exactly.
+"""
+from array import array
+
+EXACT, LOWERBOUND, UPPERBOUND = 0, 1, 2     # score is exact, at least score (fail high), at most score (fail low)
+replacementPolicies = ("depth", "always")
+
+
+
+class TranspositionTable():
+
+    # bytes per slot: key (Q) + score (d) + best move (i) + depth (b) + bound (b) + search generation (B)
+    entryBytes = 8 + 8 + 4 + 1 + 1 + 1
+
+    def __init__(self, sizeMB=16, replacement="depth"):
+        if replacement not in replacementPolicies:
+            raise ValueError("replacement must be one of {}".format(replacementPolicies))
+        slots = max(1, int(sizeMB * 1024 * 1024) // self.entryBytes)
+        self.size = 1 << (slots.bit_length() - 1)           # power of two so the index is a mask of the key
+        self.mask = self.size - 1
+        self.replacement = replacement
+        self.keys = array("Q", bytes(8 * self.size))
+        self.scores = array("d", bytes(8 * self.size))
+        self.moves = array("i", bytes(4 * self.size))
+        self.depths = array("b", [-1]) * self.size           # -1 marks an empty slot
+        self.bounds = array("b", bytes(self.size))
+        self.generations = array("B", bytes(self.size))
+        self.generation = 0
+        self.resetStats()
+
+
+
+    def resetStats(self):
+        self.probes = 0
+        self.hits = 0
+        self.collisions = 0         # slot in use by a different position
+        self.stores = 0
+        self.overwrites = 0         # a different position was evicted
+        self.rejected = 0           # store skipped by the replacement policy
+
+
+
+    def newSearch(self):
+        """ Start a new search: entries from older searches become the first to be replaced """
+        self.generation = (self.generation + 1) & 0xFF
+
+
+
+    def clear(self):
+        self.depths = array("b", [-1]) * self.size
+        self.generation = 0
+        self.resetStats()
+
+
+
+    def probe(self, key):
+        """ Return (depth, score, bound, moveID) stored for key, or None """
+        self.probes += 1
+        i = key & self.mask
+        if self.depths[i] < 0:
+            return None
+        if self.keys[i] != key:
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return self.depths[i], self.scores[i], self.bounds[i], self.moves[i]
+
+
+
+    def store(self, key, depth, score, bound, moveID):
+        i = key & self.mask
+        storedDepth = self.depths[i]
+        if storedDepth >= 0 and self.keys[i] != key:
+            if self.replacement == "depth" and self.generations[i] == self.generation and storedDepth > depth:
+                self.rejected += 1
+                return
+            self.overwrites += 1
+        elif storedDepth >= 0 and moveID < 0:
+            moveID = self.moves[i]          # keep the best move we already know for this position
+        self.stores += 1
+        self.keys[i] = key
+        self.depths[i] = depth
+        self.scores[i] = score
+        self.bounds[i] = bound
+        self.moves[i] = moveID
+        self.generations[i] = self.generation
+
+
+
+    def memoryBytes(self):
+        return sum(a.buffer_info()[1] * a.itemsize for a in (self.keys, self.scores, self.moves, self.depths, self.bounds, self.generations))
+
+
+
+    def usedSlots(self):
+        return self.size - self.depths.count(-1)
+
+
+
+    def stats(self):
+        return {"size": self.size,
+                "memoryMB": self.memoryBytes() / (1024 * 1024),
+                "used": self.usedSlots(),
+                "probes": self.probes,
+                "hits": self.hits,
+                "hitRate": self.hits / self.probes if self.probes else 0.0,
+                "collisions": self.collisions,
+                "stores": self.stores,
+                "overwrites": self.overwrites,
+                "rejected": self.rejected}
+
+
+
+    def report(self):
+        s = self.stats()
+        return "TT {size} slots ({memoryMB:.1f} MB, {used} used)  probes {probes}  hits {hits} ({hitRate:.1%})  " \
+               "collisions {collisions}  stores {stores}  overwrites {overwrites}  rejected {rejected}".format(**s)
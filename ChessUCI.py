@@ -0,0 +1,224 @@
+"""
+UCI (Universal Chess Interface) front-end, so the engine can be driven by match runners and GUIs over stdin/stdout. It only
+imports the engine and the search, never pygame, so it starts fast and runs on servers without a display.
+
+    python ChessUCI.py
+
+Supported: uci, isready, ucinewgame, setoption name Hash value <MB>, position startpos|fen <fen> [moves ...],
+go [depth N] [movetime ms] [nodes N] [wtime ms btime ms winc ms binc ms movestogo N] [infinite], stop, quit.
+A malformed command, or a position with an illegal or under-promoting move, is answered with info string and ignored.
+"""
+import sys
+import threading
+import time
+import ChessAlgo
+import ChessTT
+from ChessEngine import GameState, startFEN
+
+engineName = "Chess-Engine"
+engineAuthor = "Chess-Engine contributors"
+defaultMovesToGo = 30           # a clock without movestogo is shared as if this many moves were left
+
+
+
+def moveToUCI(move):
+    """ Long algebraic notation as UCI wants it, e.g. e2e4, e1g1 (castling) or e7e8q """
+    return move.getChessNotation() + ("q" if move.isPawnPromotion else "")
+
+
+
+def findMove(gState, text):
+    """ The legal move written as text in UCI notation, or None """
+    for move in gState.getValidMoves():
+        if moveToUCI(move) == text or (move.isPawnPromotion and move.getChessNotation() == text):
+            return move
+    return None
+
+
+
+class UCIEngine():
+
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.gState = GameState.fromFEN(startFEN)
+        self.searchThread = None
+        self.stopSearch = threading.Event()
+        self.searchStart = 0.0
+
+
+
+    def send(self, line):
+        self.output.write(line + "\n")
+        self.output.flush()
+
+
+
+    def handle(self, line):
+        """ Act on one command line; returns False on quit. A malformed command is reported and otherwise ignored """
+        try:
+            return self.handleCommand(line.split())
+        except ValueError as error:
+            self.send("info string ignored {!r}: {}".format(line.strip(), error))
+            return True
+
+
+
+    def handleCommand(self, tokens):
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == "uci":
+            self.send("id name " + engineName)
+            self.send("id author " + engineAuthor)
+            self.send("option name Hash type spin default {} min 1 max 4096".format(ChessAlgo.transpositionTableMB))
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.waitForSearch()
+            ChessAlgo.transpositionTable.clear()
+            ChessAlgo.moveOrdering.clear()
+        elif command == "setoption":
+            self.setOption(tokens)
+        elif command == "position":
+            self.waitForSearch()
+            self.setPosition(tokens)
+        elif command == "go":
+            self.waitForSearch()
+            self.go(tokens)
+        elif command == "stop":
+            self.waitForSearch()
+        elif command == "quit":
+            self.waitForSearch()
+            return False
+        return True
+
+
+
+    def setOption(self, tokens):
+        if "name" in tokens and "value" in tokens:
+            name = " ".join(tokens[tokens.index("name") + 1:tokens.index("value")])
+            value = " ".join(tokens[tokens.index("value") + 1:])
+            if name.lower() == "hash":
+                megabytes = min(max(int(value), 1), 4096)
+                self.waitForSearch()
+                ChessAlgo.transpositionTableMB = megabytes
+                ChessAlgo.transpositionTable = ChessTT.TranspositionTable(megabytes, ChessAlgo.transpositionTableReplacement)
+
+
+
+    def setPosition(self, tokens):
+        """
+        Set up the position; the whole command is rejected (ValueError) and the previous position kept if the FEN or any
+        of the moves is invalid. The engine only promotes to a queen, so an under-promotion is rejected too."""
+        if "moves" in tokens:
+            movesAt = tokens.index("moves")
+            moves = tokens[movesAt + 1:]
+        else:
+            movesAt = len(tokens)
+            moves = []
+        if len(tokens) > 1 and tokens[1] == "fen":
+            gState = GameState.fromFEN(" ".join(tokens[2:movesAt]))
+        else:
+            gState = GameState.fromFEN(startFEN)
+        for text in moves:
+            move = findMove(gState, text)
+            if move is None:
+                raise ValueError("illegal or unsupported move " + text)
+            gState.makeMove(move)
+        self.gState = gState
+
+
+
+    def go(self, tokens):
+        """ Start the search in a thread so stop can still be read from stdin """
+        options = {}
+        for i, token in enumerate(tokens[:-1]):
+            if token in ("depth", "movetime", "nodes", "wtime", "btime", "winc", "binc", "movestogo"):
+                options[token] = int(tokens[i + 1])
+        timeLimit = None
+        maxDepth = options.get("depth")
+        if "movetime" in options:
+            timeLimit = options["movetime"] / 1000
+        elif "wtime" in options or "btime" in options:
+            clock, increment = ("wtime", "winc") if self.gState.whiteToMove else ("btime", "binc")
+            remaining = options.get(clock, 0)
+            timeLimit = (remaining / options.get("movestogo", defaultMovesToGo) + options.get(increment, 0) / 2) / 1000
+            timeLimit = min(timeLimit, remaining / 2000)            # never more than half of the clock
+        infinite = "infinite" in tokens
+        if infinite or (maxDepth is None and timeLimit is None and "nodes" not in options):
+            maxDepth = maxDepth or ChessAlgo.maxSearchDepth
+        self.stopSearch.clear()
+        self.searchThread = threading.Thread(target=self.search, args=(timeLimit, options.get("nodes"), maxDepth, infinite),
+                                             daemon=True)
+        self.searchThread.start()
+
+
+
+    def search(self, timeLimit, nodeLimit, maxDepth, infinite=False):
+        ChessAlgo.stopRequested = self.stopSearch.is_set
+        ChessAlgo.reportIteration = self.reportIteration
+        self.searchStart = time.perf_counter()
+        move = None
+        try:
+            validMoves = self.gState.getValidMoves()
+            if validMoves:
+                move = validMoves[0]                # also the answer if the search fails
+                bestMove = ChessAlgo.findBestMove(self.gState, validMoves, timeLimit, nodeLimit, maxDepth)
+                if bestMove is not None:
+                    move = bestMove
+        except Exception as error:             # the GUI waits for a bestmove whatever happened
+            self.send("info string search failed: {!r}".format(error))
+        finally:
+            ChessAlgo.stopRequested = None
+            ChessAlgo.reportIteration = None
+            if infinite:
+                self.stopSearch.wait()          # the search may end early (mate, maximum depth); UCI wants bestmove after stop
+            self.send("bestmove " + (moveToUCI(move) if move is not None else "0000"))
+
+
+
+    def reportIteration(self, depth, score, nodes, principalVariation):
+        elapsed = max(time.perf_counter() - self.searchStart, 1e-6)
+        sideScore = score if self.gState.whiteToMove else -score
+        if abs(sideScore) == ChessAlgo.checkMatePoint:
+            plies = max(len(principalVariation), 1)
+            scoreText = "mate {}".format((plies + 1) // 2 if sideScore > 0 else -(plies // 2))
+        else:
+            scoreText = "cp {}".format(round(sideScore * 100))
+        pv = []
+        for moveID in principalVariation:
+            move = self.gState.getHashMove(moveID)
+            if move is None:
+                break
+            pv.append(moveToUCI(move))
+            self.gState.makeMove(move)
+        for i in range(len(pv)):
+            self.gState.undoLastMove()
+        self.send("info depth {} score {} nodes {} nps {} time {} pv {}".format(
+            depth, scoreText, nodes, int(nodes / elapsed), int(elapsed * 1000), " ".join(pv)))
+
+
+
+    def waitForSearch(self):
+        """
+        Stop the running search and wait for its bestmove. The GUI should send stop first, but a search without a limit
+        would otherwise run to maxSearchDepth while the command that needs it waits."""
+        if self.searchThread is not None:
+            self.stopSearch.set()
+            self.searchThread.join()
+            self.searchThread = None
+
+
+
+def main():
+    engine = UCIEngine()
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    engine.waitForSearch()
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Long-lived engine process for the GUI. It is started once and takes search requests over a pipe, so the process start-up and
+the imports are paid once per game instead of once per move. The transposition table and the history stay warm between
+moves. A search is cancelled through a shared counter rather than by terminating the process.
+
+    python ChessWorker.py          compare the per-move latency with spawning a Process per move
+"""
+import argparse
+import time
+import multiprocessing
+from multiprocessing import Process, Pipe, Queue, RawValue
+import ChessAlgo
+import ChessEngine
+import ChessBitboard
+from ChessBench import benchmarkPositions
+
+
+
+def workerLoop(conn, cancelledID, useBitboards, useOpeningBook=True):
+    """
+    Engine process: answer ("search", requestID, fen, moveIDs, timeLimit) with ("bestmove", requestID, moveID, SearchStats),
+    moveID -1 and no statistics when there is no move, until ("quit",) arrives. fen and moveIDs come from GameState.getHistory, so repetitions are seen.
+    A search stops early once cancelledID reaches its requestID. useOpeningBook is set here, as a spawned process does
+    not inherit ChessAlgo's settings from its parent."""
+    backend = ChessBitboard.BitboardGameState if useBitboards else ChessEngine.GameState
+    ChessAlgo.useOpeningBook = useOpeningBook
+    requestID = 0
+    ChessAlgo.stopRequested = lambda: cancelledID.value >= requestID
+    conn.send(("ready",))
+    while True:
+        message = conn.recv()
+        if message[0] == "quit":
+            break
+        command, requestID, fen, moveIDs, timeLimit = message
+        moveID = -1
+        stats = None
+        if cancelledID.value < requestID:
+            gState = backend.fromFEN(fen, moveIDs)
+            validMoves = gState.getValidMoves()
+            if validMoves:
+                move = ChessAlgo.findBestMove(gState, validMoves, timeLimit)
+                if move is not None:
+                    moveID = move.moveID
+                stats = ChessAlgo.searchStats
+        conn.send(("bestmove", requestID, moveID, stats))
+    conn.close()
+
+
+
+class EngineWorker():
+
+    def __init__(self, useBitboards=False, useOpeningBook=True):
+        self.conn, childConn = Pipe()
+        self.cancelledID = RawValue("i", 0)
+        self.requestID = 0
+        self.process = Process(target=workerLoop, args=(childConn, self.cancelledID, useBitboards, useOpeningBook),
+                               daemon=True)
+        self.process.start()
+        self.ready = False
+        self.lastStats = None                   # ChessAlgo.SearchStats of the latest answered search
+
+
+
+    def search(self, gState, timeLimit=None):
+        """ Start searching gState in the background; a search still running is cancelled """
+        self.cancel()
+        self.requestID += 1
+        fen, moveIDs = gState.getHistory()
+        self.conn.send(("search", self.requestID, fen, moveIDs, timeLimit))
+
+
+
+    def cancel(self):
+        """ Stop the current search, its answer is dropped """
+        self.cancelledID.value = self.requestID
+
+
+
+    def poll(self):
+        """ The moveID found for the latest request (-1 if there was no move), or None while it is still searching """
+        while self.conn.poll():
+            message = self.conn.recv()
+            if message[0] == "ready":
+                self.ready = True
+            elif message[1] == self.requestID and self.cancelledID.value < self.requestID:
+                self.lastStats = message[3]
+                return message[2]
+        return None
+
+
+
+    def waitForMove(self):
+        while True:
+            self.conn.poll(None)
+            moveID = self.poll()
+            if moveID is not None:
+                return moveID
+
+
+
+    def close(self):
+        self.cancel()
+        self.conn.send(("quit",))
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+
+def searchWithoutBook(gState, validMoves, returnQueue, timeLimit):
+    """ Process per move of the latency benchmark: ChessAlgo.searchBestMoveMinMax with the opening book off """
+    ChessAlgo.useOpeningBook = False
+    ChessAlgo.searchBestMoveMinMax(gState, validMoves, returnQueue, timeLimit)
+
+
+
+def latencyBenchmark(timeLimit):
+    """
+    Per-move wall time of the persistent worker against a new Process per move (as ChessMain used to do). The opening
+    book is off on both sides, so every position is searched."""
+    start = time.perf_counter()
+    worker = EngineWorker(useOpeningBook=False)
+    worker.conn.poll(None)
+    worker.poll()
+    startupTime = time.perf_counter() - start
+    workerTimes = []
+    for name, fen in benchmarkPositions:
+        gState = ChessEngine.GameState.fromFEN(fen)
+        start = time.perf_counter()
+        worker.search(gState, timeLimit)
+        worker.waitForMove()
+        workerTimes.append(time.perf_counter() - start)
+    worker.close()
+
+    processTimes = []
+    for name, fen in benchmarkPositions:
+        gState = ChessEngine.GameState.fromFEN(fen)
+        start = time.perf_counter()
+        returnQueue = Queue()
+        process = Process(target=searchWithoutBook, args=(gState, gState.getValidMoves(), returnQueue, timeLimit))
+        process.start()
+        returnQueue.get()
+        process.join()
+        processTimes.append(time.perf_counter() - start)
+
+    print("start method {}, {}s per search".format(multiprocessing.get_start_method(), timeLimit))
+    print("worker start-up (once)   {:7.3f}s".format(startupTime))
+    for (name, fen), workerTime, processTime in zip(benchmarkPositions, workerTimes, processTimes):
+        print("{:<26} persistent worker {:7.3f}s  process per move {:7.3f}s  overhead saved {:6.3f}s".format(
+            name, workerTime, processTime, processTime - workerTime))
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-move latency of the persistent engine worker")
+    parser.add_argument("--time", type=float, default=0.2, help="seconds per search")
+    parser.add_argument("--start-method", choices=multiprocessing.get_all_start_methods(), help="e.g. spawn, as on Windows and macOS")
+    args = parser.parse_args()
+    if args.start_method:
+        multiprocessing.set_start_method(args.start_method)
+    latencyBenchmark(args.time)
+
+
+
+if __name__ == "__main__":
+    main()